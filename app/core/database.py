@@ -2,6 +2,7 @@ from supabase import create_client, Client
 from app.core.config import settings
 from app.core.exceptions import SupabaseConnectionError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,7 +36,7 @@ class SupabaseClient:
                 cls._instance.table("scraped_data").select("id").limit(1).execute()
                 
                 cls._connection_healthy = True
-                logger.info("✅ Supabase connection successful and healthy")
+                logger.info(f"✅ Supabase connection successful and healthy (client id: {id(cls._instance)})")
                 
             except Exception as e:
                 logger.error(f"❌ Supabase connection failed: {e}")
@@ -59,5 +60,23 @@ class SupabaseClient:
 
 # Convenience function
 def get_db() -> Client:
+    """
+    FastAPI dependency returning the shared Supabase client.
+    Fast path skips the retry wrapper once connected so every request reuses
+    the same client (and its underlying HTTP connection pool).
+    """
+    client = SupabaseClient._instance
+    if client is not None:
+        return client
     return SupabaseClient.get_client()
 
+
+async def execute_async(query):
+    """
+    Run a supabase-py query builder's blocking .execute() in a worker thread
+    so async endpoints don't stall the event loop for the Supabase round trip.
+    
+    Usage:
+        result = await execute_async(db.table("scraped_data").select("id").eq("id", lead_id))
+    """
+    return await asyncio.to_thread(query.execute)
@@ -0,0 +1,77 @@
+"""
+Shared httpx.AsyncClient instances for outbound API calls.
+Reusing one client keeps TCP/TLS connections alive across requests instead of
+paying a fresh handshake per call.
+"""
+import asyncio
+import logging
+from typing import Any, List, Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_registry: List["SharedAsyncClient"] = []
+
+class SharedAsyncClient:
+    """
+    Lazily-built, pooled httpx.AsyncClient.
+    The client is created inside the running event loop on first use and
+    rebuilt if the loop changes (avoids "Event loop is closed" errors when a
+    client outlives the loop it was created on, e.g. in scripts/tests).
+    
+    Usage:
+        _client = SharedAsyncClient("my_api", timeout=30.0)
+        response = await _client.get().post(url, json=payload)
+    """
+    
+    def __init__(self, name: str, **client_kwargs: Any):
+        self.name = name
+        self._client_kwargs = client_kwargs
+        self._client_kwargs.setdefault(
+            "limits",
+            httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        _registry.append(self)
+    
+    def get(self) -> httpx.AsyncClient:
+        """Get the shared client for the current event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._discard_stale_client()
+            self._client = httpx.AsyncClient(**self._client_kwargs)
+            self._loop = loop
+            logger.debug(f"🔌 Created shared HTTP client: {self.name}")
+        return self._client
+    
+    def _discard_stale_client(self):
+        """
+        Release a client built on a different event loop before replacing it.
+        Its connections belong to that loop, so it can only be closed there:
+        schedule aclose() if the loop is still running, otherwise drop it with a warning.
+        """
+        stale, stale_loop = self._client, self._loop
+        if stale is None or stale.is_closed:
+            return
+        if stale_loop is not None and stale_loop.is_running():
+            asyncio.run_coroutine_threadsafe(stale.aclose(), stale_loop)
+            logger.debug(f"🔌 Closing shared HTTP client {self.name} on its previous event loop")
+        else:
+            logger.warning(f"⚠️ Discarding shared HTTP client {self.name} bound to a stopped event loop")
+    
+    async def aclose(self):
+        """Close the underlying client (safe to call repeatedly)"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.debug(f"🔌 Closed shared HTTP client: {self.name}")
+        self._client = None
+        self._loop = None
+
+async def close_shared_clients():
+    """Close every shared client - call from application shutdown"""
+    for shared in _registry:
+        try:
+            await shared.aclose()
+        except Exception as e:
+            logger.error(f"Error closing HTTP client {shared.name}: {e}")
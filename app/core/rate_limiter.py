@@ -50,16 +50,20 @@ class RateLimiter:
                 "min_delay": 1.5  # 1.5 seconds between emails
             },
             
-            # Apollo: 10 requests per minute (conservative)
+            # Apollo: ~1 request per second recommended, 50 per minute
             "apollo": {
-                "max_requests": 10,
+                "max_requests": 50,
                 "time_window": 60,
                 "requests": [],
                 "last_request": None,
-                "min_delay": 6.0
+                "min_delay": 1.2
             }
         }
         
+        # One lock per API so concurrent callers take slots one at a time
+        # (otherwise they all see the same last_request and fire together)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        
         # Start periodic cleanup task
         import asyncio
         asyncio.create_task(self._periodic_cleanup())
@@ -121,6 +125,15 @@ class RateLimiter:
             logger.warning(f"Unknown API: {api_name}, allowing request")
             return True
         
+        lock = self._locks.get(api_name)
+        if lock is None:
+            lock = self._locks[api_name] = asyncio.Lock()
+        
+        async with lock:
+            return await self._acquire(api_name)
+    
+    async def _acquire(self, api_name: str) -> bool:
+        """Wait for and record a slot for api_name (caller holds the API's lock)"""
         limiter = self.limiters[api_name]
         current_time = time.time()
         
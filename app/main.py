@@ -6,9 +6,11 @@ from app.core.config import settings
 from app.core.exceptions import BaseAPIException
 from app.core.error_handlers import base_api_exception_handler, general_exception_handler
 from app.services.scheduler_service import SchedulerService
+from app.services.email_batch_queue import email_batch_queue
 from app.core.database import get_db
 from app.core.logging_config import setup_logging
 from app.core.middleware import RequestIDMiddleware
+from app.core.http_client import close_shared_clients
 import logging
 import sys
 
@@ -30,11 +32,14 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Starting application...")
     scheduler_service.start()
     logger.info("✅ Scheduler started")
+    email_batch_queue.start()
     yield
     # Shutdown: Stop scheduler
     logger.info("🛑 Shutting down application...")
+    await email_batch_queue.stop()
     scheduler_service.stop()
     logger.info("✅ Scheduler stopped")
+    await close_shared_clients()
 
 app = FastAPI(
     title="Lead Scraping & Email Automation API",
@@ -1,15 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from app.services.apollo_service import ApolloService
 from app.services.lead_scraper_factory import LeadScraperFactory
-from app.services.website_service import WebsiteService
-from app.services.email_personalization_service import EmailPersonalizationService
-from app.services.timezone_service import TimezoneService
 from app.services.simplified_email_tracking_service import SimplifiedEmailTrackingService
 # from app.services.batch_tracking_service import BatchTrackingService # REMOVED
-from app.services.dead_letter_queue_service import DeadLetterQueueService
-from app.core.database import get_db
+from app.services.email_batch_queue import email_batch_queue, EmailBatchQueueFull
+from app.core.database import get_db, execute_async
 from app.models.apollo_search import ApolloSearchCreate
 from app.models.lead import Lead, LeadCreate
 from supabase import Client
@@ -23,179 +20,8 @@ from typing import Optional as Opt
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-async def _send_emails_to_leads(lead_ids: List[str], db: Client):
-    """
-    Send emails to leads with batch tracking, DLQ, and timezone checks.
-    MAX 10 LEADS ENFORCED.
-    """
-    try:
-        # CRITICAL SAFETY CHECK: Enforce maximum 10 leads
-        MAX_LEADS = 10
-        if len(lead_ids) > MAX_LEADS:
-            logger.warning(f"⚠️ CRITICAL: Received {len(lead_ids)} lead_ids, limiting to {MAX_LEADS} for safety")
-            lead_ids = lead_ids[:MAX_LEADS]
-        
-        logger.info("=" * 80)
-        logger.info(f"🚀 STARTING EMAIL SENDING PROCESS for {len(lead_ids)} leads")
-        logger.info("=" * 80)
-        
-        # Initialize services
-        tracking_service = SimplifiedEmailTrackingService(db, batch_size=10)
-        # Initialize services
-        tracking_service = SimplifiedEmailTrackingService(db, batch_size=10)
-        # batch_tracker = BatchTrackingService(db) # REMOVED
-        dlq_service = DeadLetterQueueService(db)
-        timezone_service = TimezoneService()
-        website_service = WebsiteService(db)
-        email_service = EmailPersonalizationService(db)
-        
-        # Batch tracking removed - using logging only
-        logger.info(f"📊 Processing batch of {len(lead_ids)} leads")
-        
-        # Get batch info
-        send_check = tracking_service.can_send_today()
-        next_batch_offset = send_check.get("next_batch_offset", 0)
-        logger.info(f"📊 Processing Batch #{next_batch_offset}")
-        
-        processed = 0
-        failed = 0
-        skipped_timezone = 0
-        webhook_called = 0
-        emails_sent_count = 0
-        processed_lead_ids = []
-        skipped = 0
-        
-        for lead_id in lead_ids:
-            try:
-                # Get lead data
-                lead_result = db.table("scraped_data").select("*").eq("id", lead_id).execute()
-                if not lead_result.data:
-                    logger.warning(f"Lead {lead_id} not found")
-                    skipped += 1
-                    continue
-                
-                lead = lead_result.data[0]
-                company_website = lead.get("company_website", "")
-                company_domain = None
-                if company_website:
-                    company_domain = company_website.replace("https://", "").replace("http://", "").split("/")[0]
-                company_country = lead.get("company_country")
-                
-                # Step 1: Check timezone (Mon-Sat, 9 AM - 6 PM)
-                timezone_check = timezone_service.check_lead_business_hours(
-                    country=company_country,
-                    start_hour=9,
-                    end_hour=18  # 6 PM
-                )
-                
-                is_business_hours = timezone_check.get("is_business_hours", False)
-                should_queue = False
-                
-                if not is_business_hours:
-                    logger.info(f"⏸️ Lead {lead_id} - Not in business hours. Queueing.")
-                    skipped_timezone += 1
-                    should_queue = True
-                
-                # Step 2: Scrape website
-                if company_domain:
-                    try:
-                        scrape_result = await website_service.scrape_company_website(
-                            company_domain=company_domain,
-                            company_website=company_website
-                        )
-                    except Exception as e:
-                        logger.error(f"❌ Failed to scrape website for {company_domain}: {e}")
-                
-                # Step 3: Generate email
-                try:
-                    email_result = await email_service.generate_email_for_lead(
-                        lead_id=lead_id,
-                        email_type="initial"
-                    )
-                    
-                    if email_result.get("success"):
-                        # Step 4: Send or Queue
-                        try:
-                            from app.services.email_sending_service import EmailSendingService
-                            email_sending_service = EmailSendingService(db)
-                            
-                            if should_queue:
-                                queue_result = await email_sending_service.queue_email_for_lead(
-                                    lead_id=lead_id,
-                                    email_type="initial",
-                                    company_country=company_country
-                                )
-                                if not queue_result.get("success"):
-                                    logger.warning(f"❌ Failed to queue email: {queue_result.get('error')}")
-                            else:
-                                send_result = await email_sending_service.send_email_to_lead(
-                                    lead_id=lead_id,
-                                    email_type="initial"
-                                )
-                                
-                                if send_result.get("success"):
-                                    logger.info(f"✅ Email sent for lead {lead_id}")
-                                    webhook_called += 1
-                                    emails_sent_count += 1
-                                else:
-                                    logger.warning(f"❌ Failed to send email: {send_result.get('error')}")
-                                    # Add to DLQ
-                                    await dlq_service.add_failed_email(
-                                        lead_id=lead_id,
-                                        email_to=lead.get("founder_email"),
-                                        subject=email_result.get("subject", ""),
-                                        body=email_result.get("body", ""),
-                                        error=Exception(send_result.get("error", "Unknown error")),
-                                        error_type="email_send_failed"
-                                    )
-                        except Exception as e:
-                            logger.error(f"❌ Error sending/queueing email: {e}")
-                            failed += 1
-                    else:
-                        logger.warning(f"❌ Failed to generate email: {email_result.get('error')}")
-                        failed += 1
-                except Exception as e:
-                    logger.error(f"❌ Error generating email: {e}")
-                    failed += 1
-                
-                processed += 1
-                processed_lead_ids.append(lead_id)
-                
-                # Update batch progress - LOGGING ONLY
-                if processed % 5 == 0:
-                    logger.info(f"📊 Progress: {processed}/{len(lead_ids)} processed, {emails_sent_count} sent, {failed} failed")
-                
-                # Rate limiting
-                if not should_queue:
-                    await asyncio.sleep(1.5)
-                else:
-                    await asyncio.sleep(0.2)
-                
-            except Exception as e:
-                logger.error(f"❌ Error processing lead {lead_id}: {e}", exc_info=True)
-                failed += 1
-                processed_lead_ids.append(lead_id)
-        
-        # Mark processed leads
-        if processed_lead_ids:
-            tracking_service.mark_leads_processed(processed_lead_ids)
-        
-        # Record completion
-        tracking_service.record_send_completion(
-            batch_offset=next_batch_offset,
-            leads_processed=processed,
-            emails_sent=emails_sent_count
-        )
-        
-        # Mark batch complete - LOGGING ONLY
-        logger.info(f"✅ Batch processing complete")
-        
-        logger.info("=" * 80)
-        logger.info(f"📊 Email sending completed: {processed} processed, {emails_sent_count} sent")
-        logger.info("=" * 80)
-        
-    except Exception as e:
-        logger.error(f"❌ CRITICAL ERROR: {e}", exc_info=True)
+# Columns returned by the lead list endpoint (full rows via GET /{lead_id})
+LEAD_LIST_COLUMNS = "id,founder_name,founder_email,company_name,position,company_country,mail_status,created_at"
 
 class ScrapeLeadsRequest(BaseModel):
     employee_size_min: Opt[int] = None
@@ -225,7 +51,7 @@ async def scrape_leads(request: ScrapeLeadsRequest, db: Client = Depends(get_db)
         search_data["total_leads_wanted"] = request.total_leads_wanted
     
     try:
-        search_insert = db.table("apollo_searches").insert(search_data).execute()
+        search_insert = await execute_async(db.table("apollo_searches").insert(search_data))
         search_id = search_insert.data[0]["id"] if search_insert.data else None
         if not search_id:
             raise HTTPException(status_code=500, detail="Failed to create search record")
@@ -249,19 +75,7 @@ async def scrape_leads(request: ScrapeLeadsRequest, db: Client = Depends(get_db)
     try:
         scraper = LeadScraperFactory.create_scraper(source)
         
-        if source == "apollo":
-            apollo_service = ApolloService()
-            all_leads = await apollo_service.search_people(
-                employee_size_min=request.employee_size_min,
-                employee_size_max=request.employee_size_max,
-                countries=request.countries or [],
-                sic_codes=request.sic_codes or [],
-                c_suites=request.c_suites,
-                industry=request.industry,
-                total_leads_wanted=request.total_leads_wanted,
-                enrich_leads=True  # ✅ Enable two-step enrichment
-            )
-        else:
+        if source != "apollo":
             raise ValueError(f"Unsupported source: {source}. Only 'apollo' is supported.")
         
         # Store in scraped_data
@@ -275,41 +89,62 @@ async def scrape_leads(request: ScrapeLeadsRequest, db: Client = Depends(get_db)
             "apollo_search_id"
         }
         
-        leads_to_insert = []
-        for lead in all_leads:
-            if isinstance(lead, dict):
-                lead_dict = lead
-            else:
-                lead_dict = lead.model_dump(exclude_none=True)
+        apollo_service = ApolloService()
+        total_found = 0
+        total_inserted = 0
+        batch_no = 0
+        
+        # Insert each enriched batch as soon as it arrives instead of holding every lead in memory
+        async for leads_batch in apollo_service.iter_people(
+            employee_size_min=request.employee_size_min,
+            employee_size_max=request.employee_size_max,
+            countries=request.countries or [],
+            sic_codes=request.sic_codes or [],
+            c_suites=request.c_suites,
+            industry=request.industry,
+            total_leads_wanted=request.total_leads_wanted,
+            enrich_leads=True  # ✅ Enable two-step enrichment
+        ):
+            total_found += len(leads_batch)
+            batch_no += 1
             
-            # Filter to only include allowed fields
-            filtered_lead = {k: v for k, v in lead_dict.items() if k in allowed_fields}
-            filtered_lead["apollo_search_id"] = search_id
-            leads_to_insert.append(filtered_lead)
+            leads_to_insert = []
+            for lead in leads_batch:
+                if isinstance(lead, dict):
+                    lead_dict = lead
+                else:
+                    lead_dict = lead.model_dump(exclude_none=True)
+                
+                # Filter to only include allowed fields
+                filtered_lead = {k: v for k, v in lead_dict.items() if k in allowed_fields}
+                filtered_lead["apollo_search_id"] = search_id
+                leads_to_insert.append(filtered_lead)
             
-        if leads_to_insert:
-            # Batch insert
-            batch_size = 100
-            total_inserted = 0
-            for i in range(0, len(leads_to_insert), batch_size):
-                batch = leads_to_insert[i:i + batch_size]
-                try:
-                    insert_result = db.table("scraped_data").insert(batch).execute()
-                    inserted_count = len(insert_result.data) if insert_result.data else len(batch)
-                    total_inserted += inserted_count
-                    logger.info(f"✅ Inserted batch {i//batch_size + 1}: {inserted_count} leads stored in Supabase")
-                except Exception as e:
-                    logger.error(f"❌ Insert failed for batch {i//batch_size + 1}: {e}")
+            if not leads_to_insert:
+                continue
             
-            logger.info(f"✅ Total leads stored in Supabase: {total_inserted}/{len(leads_to_insert)}")
+            try:
+                insert_result = await execute_async(db.table("scraped_data").insert(leads_to_insert))
+                inserted_count = len(insert_result.data) if insert_result.data else len(leads_to_insert)
+                total_inserted += inserted_count
+                logger.info(f"✅ Inserted batch {batch_no}: {inserted_count} leads stored in Supabase")
+            except Exception as e:
+                logger.error(f"❌ Insert failed for batch {batch_no}: {e}")
+        
+        if total_found:
+            logger.info(f"✅ Total leads stored in Supabase: {total_inserted}/{total_found}")
         
-        db.table("apollo_searches").update({"status": "completed"}).eq("id", search_id).execute()
+        await execute_async(db.table("apollo_searches").update({"status": "completed"}).eq("id", search_id))
         
-        return {"success": True, "total_leads_found": len(all_leads)}
+        response = {"success": True, "total_leads_found": total_found}
+        if apollo_service.dropped_search_pages:
+            # Some search pages failed even after retries - results are incomplete
+            response["dropped_pages"] = apollo_service.dropped_search_pages
+        return response
         
     except Exception as e:
         logger.error(f"Scraping failed: {e}")
-        db.table("apollo_searches").update({"status": "failed"}).eq("id", search_id).execute()
+        await execute_async(db.table("apollo_searches").update({"status": "failed"}).eq("id", search_id))
         
         error_msg = str(e)
         if "Apollo API 403" in error_msg:
@@ -322,11 +157,19 @@ async def send_emails_to_leads_endpoint(request: SendEmailsRequest, db: Client =
     """Send emails to leads (manual or automatic batch) - MAX 10 LEADS"""
     try:
         lead_ids = request.lead_ids
+        claimed_leads = []
         
+        # Explicit lead_ids skip the tracking service entirely; only the
+        # automatic path pays for the can-send check (and stops there if not)
         if not lead_ids:
+            # get_next_batch_leads locks the leads it returns, so don't claim
+            # any unless the queue can take the batch
+            if not email_batch_queue.can_accept():
+                raise HTTPException(status_code=503, detail="Email batch queue is full or not running, try again later")
+            
             # Get next batch from tracking service
             tracking_service = SimplifiedEmailTrackingService(db, batch_size=10)
-            send_check = tracking_service.can_send_today()
+            send_check = await asyncio.to_thread(tracking_service.can_send_today)
             
             if not send_check["can_send"]:
                 return {
@@ -335,8 +178,8 @@ async def send_emails_to_leads_endpoint(request: SendEmailsRequest, db: Client =
                     "next_batch_offset": send_check["next_batch_offset"]
                 }
             
-            leads = tracking_service.get_next_batch_leads()
-            lead_ids = [l["id"] for l in leads]
+            claimed_leads = await asyncio.to_thread(tracking_service.get_next_batch_leads)
+            lead_ids = [l["id"] for l in claimed_leads]
             
             if not lead_ids:
                 return {"success": True, "message": "No unprocessed leads found"}
@@ -347,14 +190,25 @@ async def send_emails_to_leads_endpoint(request: SendEmailsRequest, db: Client =
             logger.warning(f"⚠️ Received {len(lead_ids)} lead_ids, limiting to {MAX_LEADS} for safety")
             lead_ids = lead_ids[:MAX_LEADS]
         
-        # Start background task
-        task = asyncio.create_task(_send_emails_to_leads(lead_ids, db))
+        # Hand off to the batch queue workers
+        try:
+            job_id = email_batch_queue.enqueue(lead_ids, db, claimed_leads)
+        except (EmailBatchQueueFull, RuntimeError) as e:
+            logger.warning(f"⚠️ {e}")
+            # The batch won't run - give automatically claimed leads back
+            if claimed_leads:
+                await asyncio.to_thread(tracking_service.release_leads, claimed_leads)
+            raise HTTPException(status_code=503, detail=str(e))
         
         return {
             "success": True,
-            "message": f"Started processing {len(lead_ids)} leads",
-            "count": len(lead_ids)
+            "message": f"Queued {len(lead_ids)} leads for processing",
+            "count": len(lead_ids),
+            "job_id": job_id,
+            "queue_depth": email_batch_queue.depth()
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error starting email send: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -364,8 +218,10 @@ async def get_send_status(db: Client = Depends(get_db)):
     """Check if emails can be sent today"""
     try:
         tracking_service = SimplifiedEmailTrackingService(db, batch_size=10)
-        send_check = tracking_service.can_send_today()
-        stats = tracking_service.get_stats()
+        send_check, stats = await asyncio.gather(
+            asyncio.to_thread(tracking_service.can_send_today),
+            asyncio.to_thread(tracking_service.get_stats)
+        )
         
         return {
             "can_send_today": send_check["can_send"],
@@ -373,11 +229,20 @@ async def get_send_status(db: Client = Depends(get_db)):
             "next_batch_offset": send_check["next_batch_offset"],
             "total_leads": stats.get("total_leads", 0),
             "total_processed": stats.get("total_processed", 0),
-            "remaining_leads": stats.get("remaining_leads", 0)
+            "remaining_leads": stats.get("remaining_leads", 0),
+            "queue": email_batch_queue.get_stats()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/send-jobs/{job_id}")
+async def get_send_job(job_id: str):
+    """Get the state of a queued email batch"""
+    job = email_batch_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 # Batch Tracking Endpoints
 # Batch Tracking Endpoints - REMOVED/DISABLED
 # @router.get("/batch/{batch_id}") ...
@@ -385,18 +250,51 @@ async def get_send_status(db: Client = Depends(get_db)):
 # @router.get("/batches/recent") ...
 # @router.post("/batch/{batch_id}/cancel") ...
 
-@router.get("/", response_model=List[dict])
-async def get_leads(skip: int = 0, limit: int = 50, db: Client = Depends(get_db)):
+@router.get("/", response_model=dict)
+async def get_leads(
+    after: Optional[datetime] = None,
+    after_id: Optional[UUID] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Client = Depends(get_db)
+):
+    """
+    List leads newest-first using keyset pagination on (created_at, id).
+    Leads inserted in the same batch share created_at, so id breaks ties.
+    Pass the returned "next" values as `after` and `after_id` (always together) to fetch the following page.
+    """
+    # Both halves of the cursor are needed - created_at alone would skip rows sharing a timestamp
+    if (after is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail="after and after_id must be provided together")
+    
     try:
-        result = db.table("scraped_data").select("*").order("created_at", desc=True).range(skip, skip + limit - 1).execute()
-        return result.data
+        query = (
+            db.table("scraped_data")
+            .select(LEAD_LIST_COLUMNS)
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+        )
+        if after is not None:
+            # Typed (datetime/UUID) so only well-formed values reach the filter string;
+            # quoted because timestamps contain ':' and '+' which are reserved in PostgREST logic trees
+            after_ts = after.isoformat()
+            query = query.or_(
+                f'created_at.lt."{after_ts}",and(created_at.eq."{after_ts}",id.lt.{after_id})'
+            )
+        
+        result = await execute_async(query.limit(limit))
+        rows = result.data or []
+        last = rows[-1] if len(rows) == limit else None
+        return {
+            "data": rows,
+            "next": {"after": last["created_at"], "after_id": last["id"]} if last else None
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{lead_id}", response_model=dict)
 async def get_lead(lead_id: str, db: Client = Depends(get_db)):
     try:
-        result = db.table("scraped_data").select("*").eq("id", lead_id).execute()
+        result = await execute_async(db.table("scraped_data").select("*").eq("id", lead_id))
         if not result.data:
             raise HTTPException(status_code=404, detail="Lead not found")
         return result.data[0]
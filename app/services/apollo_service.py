@@ -1,16 +1,100 @@
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from app.core.config import settings
+from app.core.http_client import SharedAsyncClient
+from app.utils.retry_helper import retry_after_seconds
+from tenacity import (
+    AsyncRetrying,
+    before_sleep_log,
+    retry_if_exception_type,
+    retry_if_result,
+    stop_after_attempt,
+    wait_exponential_jitter
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+_DEFAULT_EMP_RANGES = ("1,10", "11,20", "21,50", "51,100", "101,200", "201,500")
+
+# One pooled client for all Apollo calls (search pages + enrichment reuse connections)
+_apollo_client = SharedAsyncClient("apollo", timeout=60.0)
+
+# Max enrichment requests in flight at once during search_people
+ENRICH_CONCURRENCY = 5
+
+# Apollo's /people/bulk_match accepts at most 10 people per request
+BULK_MATCH_SIZE = 10
+
+# Total POST attempts per Apollo call (network errors and retryable statuses share the budget)
+MAX_APOLLO_ATTEMPTS = 4
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.TransportError,)
+
+# Enrichment (/people/match, /people/bulk_match) costs credits, so only failures where
+# Apollo can't have processed the request are retried - never timeouts or gateway errors
+ENRICH_RETRYABLE_STATUS_CODES = {429}
+ENRICH_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_backoff = wait_exponential_jitter(max=30)  # starts at 1s
+
+def _apollo_wait(retry_state) -> float:
+    """ Honour Retry-After on retryable responses, jittered exponential backoff otherwise """
+    outcome = retry_state.outcome
+    if outcome is not None and not outcome.failed:
+        retry_after = outcome.result().headers.get("Retry-After")
+        if retry_after:
+            return retry_after_seconds(retry_after, retry_state.attempt_number)
+    return _backoff(retry_state)
+
+# Max search pages requested at once in _search_people_basic
+SEARCH_PAGE_CONCURRENCY = 4
+
+# Successful /people/match results keyed by Apollo id / LinkedIn URL / email,
+# so the same person seen again in another search doesn't cost another credit
+ENRICH_CACHE_TTL_SECONDS = 24 * 60 * 60
+ENRICH_CACHE_MAX_SIZE = 5000
+_enrich_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+@lru_cache(maxsize=64)
+def _employee_size_ranges(employee_size_min: Optional[int], employee_size_max: Optional[int]) -> Tuple[str, ...]:
+    """ Apollo organization_num_employees_ranges for a min/max pair (immutable, so safe to memoize) """
+    if employee_size_min and employee_size_max:
+        return (f"{employee_size_min},{employee_size_max}",)
+    if employee_size_min:
+        return (f"{employee_size_min},",)
+    if employee_size_max:
+        return (f",{employee_size_max}",)
+    return _DEFAULT_EMP_RANGES
+
+def _enrich_cache_key(person_data: Dict[str, Any]) -> Optional[str]:
+    return person_data.get("id") or person_data.get("linkedin_url") or person_data.get("email")
+
+def _get_cached_enrichment(cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not cache_key:
+        return None
+    cached = _enrich_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < ENRICH_CACHE_TTL_SECONDS:
+        return cached[1]
+    return None
+
+def _cache_enrichment(cache_key: Optional[str], person: Dict[str, Any]):
+    if not cache_key:
+        return
+    _enrich_cache[cache_key] = (time.monotonic(), person)
+    _enrich_cache.move_to_end(cache_key)
+    while len(_enrich_cache) > ENRICH_CACHE_MAX_SIZE:
+        _enrich_cache.popitem(last=False)
+
 class ApolloService:
     """
     Enhanced Apollo Service with proper two-step enrichment:
     1. Search using /mixed_people/api_search (Discovery)
-    2. Enrich using /people/match (Unlock full details)
+    2. Enrich using /people/bulk_match or /people/match (Unlock full details)
     """
     BASE_URL = "https://api.apollo.io/api/v1"
     
@@ -20,6 +104,17 @@ class ApolloService:
             raise ValueError("APOLLO_API_KEY is required. Add it to .env.")
         if self.api_key.startswith("your_"):
             raise ValueError("Invalid placeholder API key. Add real key.")
+        
+        self._headers = {
+            "accept": "application/json",
+            "Content-Type": "application/json",
+            "X-Api-Key": self.api_key
+        }
+        self._match_url = f"{self.BASE_URL}/people/match"
+        self._bulk_match_url = f"{self.BASE_URL}/people/bulk_match"
+        self._search_url = f"{self.BASE_URL}/mixed_people/api_search"
+        # Search pages that failed after retries in the last search (reported to the caller)
+        self.dropped_search_pages: List[int] = []
     
     def _get_employee_size_ranges(
         self,
@@ -27,19 +122,81 @@ class ApolloService:
         employee_size_max: Optional[int] = None
     ) -> List[str]:
         """ Convert min/max employee size to Apollo format """
-        default_ranges = ["1,10", "11,20", "21,50", "51,100", "101,200", "201,500"]
+        return list(_employee_size_ranges(employee_size_min, employee_size_max))
+    
+    async def _post(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        timeout: float = 60.0,
+        idempotent: bool = True
+    ) -> httpx.Response:
+        """
+        POST to Apollo through the shared client - the single retry layer for Apollo calls.
+        Transport errors and 429/5xx gateway responses are retried with jittered backoff,
+        honouring Retry-After. Pass idempotent=False for credit-consuming endpoints: only
+        connection failures and 429s are retried there, so a timed-out match isn't charged twice.
+        The last response is returned for the caller to check; the last network error is raised.
+        """
+        from app.core.rate_limiter import rate_limiter
+        
+        retry_statuses = RETRYABLE_STATUS_CODES if idempotent else ENRICH_RETRYABLE_STATUS_CODES
+        response = None
+        
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(MAX_APOLLO_ATTEMPTS),
+            wait=_apollo_wait,
+            retry=(
+                retry_if_exception_type(RETRYABLE_ERRORS if idempotent else ENRICH_RETRYABLE_ERRORS)
+                | retry_if_result(lambda r: r.status_code in retry_statuses)
+            ),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+            # Out of attempts: re-raise a network error, or fall through with the last response
+            retry_error_callback=lambda state: state.outcome.result()
+        ):
+            with attempt:
+                # Token bucket paces every Apollo call (search pages + enrichment) to the API's limit
+                await rate_limiter.acquire("apollo")
+                response = await _apollo_client.get().post(
+                    url,
+                    json=payload,
+                    headers=self._headers,
+                    timeout=timeout
+                )
+            if not attempt.retry_state.outcome.failed:
+                attempt.retry_state.set_result(response)
         
-        if employee_size_min is None and employee_size_max is None:
-            return default_ranges
-
-        if employee_size_min and employee_size_max:
-            return [f"{employee_size_min},{employee_size_max}"]
-        if employee_size_min:
-            return [f"{employee_size_min},"] 
-        if employee_size_max:
-            return [f",{employee_size_max}"]
-
-        return default_ranges
+        return response
+    
+    def _build_match_payload(self, person_data: Dict[str, Any]) -> Dict[str, Any]:
+        """ Build the identifier block for /people/match (empty if nothing to match on) """
+        payload = {}
+        
+        # Priority 0: Apollo ID (Most reliable if available from search)
+        if person_data.get("id"):
+            payload["id"] = person_data["id"]
+        
+        # Priority 1: LinkedIn URL (Very reliable)
+        if person_data.get("linkedin_url"):
+            payload["linkedin_url"] = person_data["linkedin_url"]
+        
+        # Priority 2: Email (if available from search)
+        if person_data.get("email"):
+            payload["email"] = person_data["email"]
+        
+        # Priority 3: Name + Company
+        if person_data.get("name"):
+            first_name, _, last_name = person_data["name"].strip().partition(" ")
+            if first_name:
+                payload["first_name"] = first_name
+            last_name = last_name.strip()
+            if last_name:
+                payload["last_name"] = last_name
+        
+        if person_data.get("organization", {}).get("name"):
+            payload["organization_name"] = person_data["organization"]["name"]
+        
+        return payload
     
     async def enrich_person(self, person_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -48,32 +205,15 @@ class ApolloService:
         
         Endpoint: https://api.apollo.io/api/v1/people/match
         """
+        cache_key = _enrich_cache_key(person_data)
+        cached = _get_cached_enrichment(cache_key)
+        if cached:
+            logger.info(f"♻️ Enrichment cache hit: {person_data.get('name', 'Unknown')}")
+            return cached
+        
         try:
             # Extract identifiers for matching
-            payload = {}
-            
-            # Priority 0: Apollo ID (Most reliable if available from search)
-            if person_data.get("id"):
-                payload["id"] = person_data["id"]
-            
-            # Priority 1: LinkedIn URL (Very reliable)
-            if person_data.get("linkedin_url"):
-                payload["linkedin_url"] = person_data["linkedin_url"]
-            
-            # Priority 2: Email (if available from search)
-            if person_data.get("email"):
-                payload["email"] = person_data["email"]
-            
-            # Priority 3: Name + Company
-            if person_data.get("name"):
-                name_parts = person_data["name"].split()
-                if len(name_parts) > 0:
-                    payload["first_name"] = name_parts[0]
-                if len(name_parts) > 1:
-                    payload["last_name"] = " ".join(name_parts[1:])
-            
-            if person_data.get("organization", {}).get("name"):
-                payload["organization_name"] = person_data["organization"]["name"]
+            payload = self._build_match_payload(person_data)
             
             # Must have at least one identifier
             if not payload:
@@ -85,22 +225,9 @@ class ApolloService:
             # Phone numbers disabled per user request
             # payload["reveal_phone_number"] = True
             
-            headers = {
-                "accept": "application/json",
-                "Content-Type": "application/json",
-                "X-Api-Key": self.api_key
-            }
-            
-            url = f"{self.BASE_URL}/people/match"
-            
             logger.info(f"🔍 Enriching: {person_data.get('name', 'Unknown')} (ID: {payload.get('id', 'N/A')})")
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers=headers
-                )
+            response = await self._post(self._match_url, payload, timeout=30.0, idempotent=False)
             
             if response.status_code == 404:
                 logger.warning(f"⚠️ No match found for {person_data.get('name', 'Unknown')}")
@@ -122,6 +249,7 @@ class ApolloService:
             
             if person:
                 logger.info(f"✅ Enriched: {person.get('name', 'Unknown')} - Email: {person.get('email', 'N/A')}")
+                _cache_enrichment(cache_key, person)
                 return person
             else:
                 logger.warning(f"⚠️ Empty enrichment response for {person_data.get('name', 'Unknown')}")
@@ -133,7 +261,83 @@ class ApolloService:
                 logger.error(f"Payload was: {payload}")
             return None
     
-    async def search_people(
+    async def enrich_people_bulk(
+        self,
+        people: List[Dict[str, Any]],
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        STEP 2 (batched): Enrich people via /people/bulk_match, up to 10 per request
+        
+        Endpoint: https://api.apollo.io/api/v1/people/bulk_match
+        
+        Args:
+            people: Search results to enrich
+            semaphore: Bounds bulk_match requests in flight; pass one shared semaphore
+                when calling this for several batches at once (default: ENRICH_CONCURRENCY per call)
+        
+        Returns:
+            List aligned with `people` - enriched person dict, or None if it couldn't be matched
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(people)
+        pending = []  # (index, cache_key, details)
+        
+        for idx, person_data in enumerate(people):
+            cache_key = _enrich_cache_key(person_data)
+            cached = _get_cached_enrichment(cache_key)
+            if cached:
+                results[idx] = cached
+                continue
+            details = self._build_match_payload(person_data)
+            if details:
+                pending.append((idx, cache_key, details))
+            else:
+                logger.warning(f"⚠️ No identifiers for enrichment: {person_data.get('name', 'Unknown')}")
+        
+        if len(pending) < len(people):
+            logger.info(f"♻️ Enrichment: {len(people) - len(pending)} leads served from cache or skipped")
+        
+        chunks = [pending[i:i + BULK_MATCH_SIZE] for i in range(0, len(pending), BULK_MATCH_SIZE)]
+        semaphore = semaphore or asyncio.Semaphore(ENRICH_CONCURRENCY)
+        
+        async def _match_chunk(chunk_no: int, chunk) -> None:
+            async with semaphore:
+                try:
+                    logger.info(f"🔍 Bulk enriching chunk {chunk_no}/{len(chunks)} ({len(chunk)} leads)")
+                    response = await self._post(
+                        self._bulk_match_url,
+                        {
+                            "details": [details for _, _, details in chunk],
+                            "reveal_personal_emails": True
+                        },
+                        timeout=30.0,
+                        idempotent=False
+                    )
+                    
+                    if response.status_code == 403:
+                        logger.error("❌ Apollo API 403 - Insufficient enrichment credits")
+                        return
+                    
+                    if response.status_code == 400:
+                        logger.error(f"❌ Apollo API 400 Bad Request on bulk_match. Response: {response.text}")
+                        return
+                    
+                    response.raise_for_status()
+                    
+                    # matches[] is aligned with details[] (null where nothing matched)
+                    matches = response.json().get("matches") or []
+                    for (idx, cache_key, _), person in zip(chunk, matches):
+                        if person:
+                            results[idx] = person
+                            _cache_enrichment(cache_key, person)
+                
+                except Exception as e:
+                    logger.error(f"❌ Bulk enrichment error on chunk {chunk_no}: {e}")
+        
+        await asyncio.gather(*(_match_chunk(n, chunk) for n, chunk in enumerate(chunks, 1)))
+        return results
+    
+    async def iter_people(
         self,
         employee_size_min: Optional[int] = None,
         employee_size_max: Optional[int] = None,
@@ -143,12 +347,15 @@ class ApolloService:
         industry: Optional[str] = None,
         total_leads_wanted: int = 200,
         enrich_leads: bool = True  # Toggle enrichment
-    ) -> List[Dict[str, Any]]:
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
         """
-        ENHANCED: Two-step process for getting fully enriched leads
+        ENHANCED: Two-step process for getting fully enriched leads, streamed in batches
         
         STEP 1: Search using /mixed_people/api_search (Discovery)
-        STEP 2: Enrich each person using /people/match (Unlock details)
+        STEP 2: Enrich in batches of 10 using /people/bulk_match (Unlock details)
+        
+        Yields each batch of parsed leads as soon as its enrichment finishes
+        (completion order, not search order), so callers can persist incrementally.
         """
         
         if not c_suites:
@@ -166,195 +373,46 @@ class ApolloService:
             total_leads_wanted=total_leads_wanted
         )
         
+        if not search_results:
+            return
+        
         if not enrich_leads:
             logger.info("⚠️ Enrichment disabled - returning basic search results")
-            parsed_leads = [self.parse_apollo_response(p) for p in search_results]
-            return parsed_leads
+            yield await asyncio.to_thread(self._parse_leads, search_results, [None] * len(search_results))
+            return
         
         # STEP 2: ENRICH (Unlock full details)
-        logger.info(f"🔓 STEP 2: Enriching {len(search_results)} leads using /people/match...")
-        enriched_leads = []
-        
-        for idx, person_data in enumerate(search_results, 1):
-            logger.info(f"Processing {idx}/{len(search_results)}: {person_data.get('name', 'Unknown')}")
-            
-            # Enrich the person
-            enriched_person = await self.enrich_person(person_data)
-            
-            if enriched_person:
-                # Parse enriched data
-                parsed_lead = self.parse_apollo_response(enriched_person)
-                enriched_leads.append(parsed_lead)
-            else:
-                # Fallback to basic data if enrichment fails
-                logger.warning(f"⚠️ Using basic data for {person_data.get('name', 'Unknown')}")
-                parsed_lead = self.parse_apollo_response(person_data)
-                enriched_leads.append(parsed_lead)
-            
-            # Rate limiting: Apollo recommends 1 request per second
-            await asyncio.sleep(1.2)
-        
-        logger.info(f"✅ Enrichment complete: {len(enriched_leads)} leads processed")
-        return enriched_leads
-    
-    async def _search_people_basic(
-        self,
-        employee_size_min: Optional[int] = None,
-        employee_size_max: Optional[int] = None,
-        countries: Optional[List[str]] = None,
-        sic_codes: Optional[List[str]] = None,
-        c_suites: Optional[List[str]] = None,
-        industry: Optional[str] = None,
-        total_leads_wanted: int = 200
-    ) -> List[Dict[str, Any]]:
-        """
-        STEP 1: Basic search using /mixed_people/api_search
-        Returns basic person data (NOT fully enriched)
-        
-        Endpoint: https://api.apollo.io/api/v1/mixed_people/api_search
-        """
-        
-        leads_per_page = 100
-        total_pages = (total_leads_wanted + leads_per_page - 1) // leads_per_page
-        
-        logger.info(f"Apollo Search: Fetching {total_leads_wanted} leads across {total_pages} pages")
-        
-        all_people = []
-
-        for page in range(1, total_pages + 1):
-            try:
-                leads_needed = total_leads_wanted - len(all_people)
-                current_per_page = min(leads_needed, 100)
-                
-                logger.info(f"Apollo Search: Page {page}/{total_pages} (Requesting {current_per_page} leads)")
-
-                # Build payload - SIC codes are PRIMARY filter
-                payload = {
-                    "page": page,
-                    "per_page": current_per_page,
-                    "person_titles": c_suites,
-                    "person_locations": countries or [],
-                    "organization_num_employees_ranges": self._get_employee_size_ranges(employee_size_min, employee_size_max),
-                    "email_status": ["verified"], # User requested ONLY verified emails
-                    "reveal_personal_emails": True, # Added per n8n config
-                }
-                
-                # CRITICAL: Only add organization_sic_codes if provided - this is the PRIMARY filter
-                if sic_codes and len(sic_codes) > 0:
-                    payload["organization_sic_codes"] = sic_codes
-                    logger.info(f"🔍 Apollo Search Page {page}: Filtering by SIC codes: {sic_codes}")
-                else:
-                    logger.warning(f"⚠️ Apollo Search Page {page}: No SIC codes provided! Results may not be filtered correctly.")
-                
-                # Remove _industry_filter - it's not a valid Apollo API parameter and may interfere with SIC code filtering
-                # Industry filtering should be done via SIC codes only
-
-                headers = {
-                    "accept": "application/json",
-                    "Content-Type": "application/json",
-                    "X-Api-Key": self.api_key
-                }
-
-                # CORRECT ENDPOINT: /mixed_people/search
-                url = f"{self.BASE_URL}/mixed_people/search"
-                
-                logger.debug(f"📤 Apollo API Payload Page {page}: {payload}")
-
-                async with httpx.AsyncClient(timeout=60.0) as client:
-                    response = await client.post(
-                        url,
-                        json=payload,
-                        headers=headers
-                    )
-
-                if response.status_code == 403:
-                    error_msg = "Apollo API 403 Forbidden — Likely insufficient credits or free plan limit reached."
-                    logger.error(f"❌ {error_msg}")
-                    raise Exception(error_msg)
-
-                response.raise_for_status()
-                
-                data = response.json()
-                people = data.get("people", [])
-                logger.info(f"Apollo Search: Page {page} returned {len(people)} leads")
-                
-                # VALIDATION: Filter results to ensure they match SIC codes
-                if sic_codes and len(sic_codes) > 0:
-                    filtered_people = []
-                    for person in people:
-                        org = person.get("organization", {})
-                        org_sic_codes = org.get("sic_codes", [])
-                        # Check if organization has any of the requested SIC codes
-                        if org_sic_codes and any(str(sic) in [str(s) for s in org_sic_codes] for sic in sic_codes):
-                            filtered_people.append(person)
-                        else:
-                            logger.warning(f"⚠️ Filtered out lead {person.get('name', 'Unknown')} - Organization SIC codes {org_sic_codes} don't match requested {sic_codes}")
-                    people = filtered_people
-                    logger.info(f"✅ After SIC code validation: {len(people)} leads match SIC codes {sic_codes}")
-
-                all_people.extend(people)
-
-                if len(all_people) >= total_leads_wanted:
-                    break
-            
-            except Exception as e:
-                logger.error(f"❌ Apollo Search Error Page {page}: {e}")
-                continue
-        
-        logger.info(f"Apollo Search: Total leads collected: {len(all_people)}")
-        return all_people[:total_leads_wanted]
-
-    def parse_apollo_response(self, person: Dict[str, Any]) -> Dict[str, Any]:
-        """ Parse Apollo person data into scraped_data format """
-        org = person.get("organization") or {}
-        
-        # ENHANCED Email extraction logic
-        email = None
-        
-        # Priority 1: Direct email field (from enrichment)
-        if person.get("email"):
-            email = person["email"]
-        
-        # Priority 2: Personal emails list
-        elif person.get("personal_emails") and len(person["personal_emails"]) > 0:
-            email = person["personal_emails"][0]
-        
-        # Priority 3: Corporate email
-        elif person.get("corporate_email"):
-            email = person["corporate_email"]
-        
-        # Priority 4: Fallback to personal_email field
-        elif person.get("personal_email"):
-            email = person["personal_email"]
-        
-        # Phone extraction DISABLED per user request
-        phone = None
-        
-        # Extract company_domain from company_website
-        company_website = org.get("website_url")
-        company_domain = None
-        if company_website:
-            # Remove protocol and path to get domain
-            import re
-            domain = re.sub(r'^https?://', '', company_website)
-            domain = re.sub(r'/.*$', '', domain)
-            company_domain = domain
-            
-        return {
-            "founder_name": person.get("name"),
-            "founder_email": email,
-            "founder_linkedin": person.get("linkedin_url"),
-            "position": person.get("title"),
-            "founder_address": person.get("formatted_address") or org.get("primary_location", {}).get("formatted_address"),
-            "company_name": org.get("name"),
-            "company_website": company_website,
-            "company_domain": company_domain,
-            "company_linkedin": org.get("linkedin_url"),
-            "company_industry": org.get("industry") or person.get("industry"),
-            "company_country": org.get("primary_location", {}).get("country"),
-            "mail_status": "pending", # Default status for new leads
-            "is_verified": True # We filter for verified emails only
-        }
+        logger.info(f"🔓 STEP 2: Enriching {len(search_results)} leads using /people/bulk_match...")
+        # One semaphore for every batch, so at most ENRICH_CONCURRENCY bulk_match calls run at once
+        semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+        
+        async def _enrich_batch(batch: List[Dict[str, Any]]):
+            return batch, await self.enrich_people_bulk(batch, semaphore)
+        
+        tasks = [
+            asyncio.create_task(_enrich_batch(search_results[i:i + BULK_MATCH_SIZE]))
+            for i in range(0, len(search_results), BULK_MATCH_SIZE)
+        ]
+        processed = 0
+        missing = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                batch, enriched_people = await next_done
+                missing += sum(1 for person in enriched_people if not person)
+                # Parse in a worker thread so the event loop stays free for in-flight requests
+                leads = await asyncio.to_thread(self._parse_leads, batch, enriched_people)
+                processed += len(leads)
+                yield leads
+        finally:
+            # Consumer stopped early (or failed) - don't leave enrichment calls running
+            for task in tasks:
+                task.cancel()
+            # Wait for the cancellations to land so no task is destroyed while pending
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        if missing:
+            logger.warning(f"⚠️ Used basic data for {missing}/{len(search_results)} leads (no enrichment match)")
+        logger.info(f"✅ Enrichment complete: {processed} leads processed")
     
     async def search_people(
         self,
@@ -368,57 +426,22 @@ class ApolloService:
         enrich_leads: bool = True  # Toggle enrichment
     ) -> List[Dict[str, Any]]:
         """
-        ENHANCED: Two-step process for getting fully enriched leads
-        
-        STEP 1: Search using /mixed_people/api_search (Discovery)
-        STEP 2: Enrich each person using /people/match (Unlock details)
+        Collect every batch from iter_people() into one list.
+        Prefer iter_people() when results are written somewhere as they arrive.
         """
-        
-        if not c_suites:
-            c_suites = ["CEO", "COO", "Director", "Founder", "President", "Owner", "Board of Directors"]
-        
-        # STEP 1: SEARCH (Discovery)
-        logger.info(f"🔍 STEP 1: Searching for {total_leads_wanted} leads using /mixed_people/api_search...")
-        search_results = await self._search_people_basic(
+        leads = []
+        async for batch in self.iter_people(
             employee_size_min=employee_size_min,
             employee_size_max=employee_size_max,
             countries=countries,
             sic_codes=sic_codes,
             c_suites=c_suites,
             industry=industry,
-            total_leads_wanted=total_leads_wanted
-        )
-        
-        if not enrich_leads:
-            logger.info("⚠️ Enrichment disabled - returning basic search results")
-            parsed_leads = [self.parse_apollo_response(p) for p in search_results]
-            return parsed_leads
-        
-        # STEP 2: ENRICH (Unlock full details)
-        logger.info(f"🔓 STEP 2: Enriching {len(search_results)} leads using /people/match...")
-        enriched_leads = []
-        
-        for idx, person_data in enumerate(search_results, 1):
-            logger.info(f"Processing {idx}/{len(search_results)}: {person_data.get('name', 'Unknown')}")
-            
-            # Enrich the person
-            enriched_person = await self.enrich_person(person_data)
-            
-            if enriched_person:
-                # Parse enriched data
-                parsed_lead = self.parse_apollo_response(enriched_person)
-                enriched_leads.append(parsed_lead)
-            else:
-                # Fallback to basic data if enrichment fails
-                logger.warning(f"⚠️ Using basic data for {person_data.get('name', 'Unknown')}")
-                parsed_lead = self.parse_apollo_response(person_data)
-                enriched_leads.append(parsed_lead)
-            
-            # Rate limiting: Apollo recommends 1 request per second
-            await asyncio.sleep(1.2)
-        
-        logger.info(f"✅ Enrichment complete: {len(enriched_leads)} leads processed")
-        return enriched_leads
+            total_leads_wanted=total_leads_wanted,
+            enrich_leads=enrich_leads
+        ):
+            leads.extend(batch)
+        return leads
     
     async def _search_people_basic(
         self,
@@ -442,113 +465,150 @@ class ApolloService:
         
         logger.info(f"Apollo Search: Fetching {total_leads_wanted} leads across {total_pages} pages")
         
-        all_people = []
-
-        for page in range(1, total_pages + 1):
-            try:
-                leads_needed = total_leads_wanted - len(all_people)
-                current_per_page = min(leads_needed, 100)
-                
-                logger.info(f"Apollo Search: Page {page}/{total_pages} (Requesting {current_per_page} leads)")
+        semaphore = asyncio.Semaphore(SEARCH_PAGE_CONCURRENCY)
+        self.dropped_search_pages = []
+        wanted_sic_codes = {str(sic) for sic in sic_codes} if sic_codes else set()
+        # Set on the first 403 so queued pages don't each burn a request on the same error
+        forbidden = asyncio.Event()
+        
+        # Build payload once - only page/per_page vary between pages. SIC codes are PRIMARY filter
+        base_payload = {
+            "person_titles": c_suites,
+            "person_locations": countries or [],
+            "organization_num_employees_ranges": self._get_employee_size_ranges(employee_size_min, employee_size_max),
+            "email_status": ["verified"], # User requested ONLY verified emails
+            "reveal_personal_emails": True, # Added per n8n config
+        }
+        
+        # CRITICAL: Only add organization_sic_codes if provided - this is the PRIMARY filter
+        if sic_codes and len(sic_codes) > 0:
+            base_payload["organization_sic_codes"] = sic_codes
+            logger.info(f"🔍 Apollo Search: Filtering by SIC codes: {sic_codes}")
+        else:
+            logger.warning(f"⚠️ Apollo Search: No SIC codes provided! Results may not be filtered correctly.")
+        
+        # Remove _industry_filter - it's not a valid Apollo API parameter and may interfere with SIC code filtering
+        # Industry filtering should be done via SIC codes only
 
-                # Build payload - SIC codes are PRIMARY filter
-                payload = {
-                    "page": page,
-                    "per_page": current_per_page,
-                    "person_titles": c_suites,
-                    "person_locations": countries or [],
-                    "organization_num_employees_ranges": self._get_employee_size_ranges(employee_size_min, employee_size_max),
-                    "email_status": ["verified"], # User requested ONLY verified emails
-                    "reveal_personal_emails": True, # Added per n8n config
-                }
-                
-                # CRITICAL: Only add organization_sic_codes if provided - this is the PRIMARY filter
-                if sic_codes and len(sic_codes) > 0:
-                    payload["organization_sic_codes"] = sic_codes
-                    logger.info(f"🔍 Apollo Search Page {page}: Filtering by SIC codes: {sic_codes}")
-                else:
-                    logger.warning(f"⚠️ Apollo Search Page {page}: No SIC codes provided! Results may not be filtered correctly.")
-                
-                # Remove _industry_filter - it's not a valid Apollo API parameter and may interfere with SIC code filtering
-                # Industry filtering should be done via SIC codes only
+        async def _fetch_page(page: int, current_per_page: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                if forbidden.is_set():
+                    logger.warning(f"⚠️ Apollo Search: Skipping page {page} after 403")
+                    self.dropped_search_pages.append(page)
+                    return []
+                try:
+                    logger.info(f"Apollo Search: Page {page}/{total_pages} (Requesting {current_per_page} leads)")
 
-                headers = {
-                    "accept": "application/json",
-                    "Content-Type": "application/json",
-                    "X-Api-Key": self.api_key
-                }
+                    payload = base_payload | {"page": page, "per_page": current_per_page}
 
-                # CORRECT ENDPOINT: /mixed_people/api_search
-                url = f"{self.BASE_URL}/mixed_people/api_search"
-                
-                logger.debug(f"📤 Apollo API Payload Page {page}: {payload}")
+                    logger.debug("📤 Apollo API Payload Page %s: %s", page, payload)
 
-                async with httpx.AsyncClient(timeout=60.0) as client:
-                    response = await client.post(
-                        url,
-                        json=payload,
-                        headers=headers
-                    )
+                    # CORRECT ENDPOINT: /mixed_people/api_search
+                    response = await self._post(self._search_url, payload)
 
-                if response.status_code == 403:
-                    error_msg = "Apollo API 403 Forbidden — Likely insufficient credits or free plan limit reached."
-                    logger.error(f"❌ {error_msg}")
-                    raise Exception(error_msg)
+                    if response.status_code == 403:
+                        forbidden.set()
+                        error_msg = "Apollo API 403 Forbidden — Likely insufficient credits or free plan limit reached."
+                        logger.error(f"❌ {error_msg}")
+                        raise Exception(error_msg)
 
-                response.raise_for_status()
+                    response.raise_for_status()
                 
-                data = response.json()
-                people = data.get("people", [])
-                logger.info(f"Apollo Search: Page {page} returned {len(people)} leads")
+                    data = response.json()
+                    people = data.get("people", [])
+                    logger.info(f"Apollo Search: Page {page} returned {len(people)} leads")
                 
-                # VALIDATION: Filter results to ensure they match SIC codes
-                if sic_codes and len(sic_codes) > 0:
-                    filtered_people = []
-                    for person in people:
-                        org = person.get("organization", {})
-                        org_sic_codes = org.get("sic_codes", [])
-                        # Check if organization has any of the requested SIC codes
-                        if org_sic_codes and any(str(sic) in [str(s) for s in org_sic_codes] for sic in sic_codes):
-                            filtered_people.append(person)
-                        else:
-                            logger.warning(f"⚠️ Filtered out lead {person.get('name', 'Unknown')} - Organization SIC codes {org_sic_codes} don't match requested {sic_codes}")
-                    people = filtered_people
-                    logger.info(f"✅ After SIC code validation: {len(people)} leads match SIC codes {sic_codes}")
+                    # VALIDATION: Filter results to ensure they match SIC codes
+                    if wanted_sic_codes:
+                        filtered_people = []
+                        for person in people:
+                            org = person.get("organization") or {}
+                            org_sic_codes = org.get("sic_codes") or []
+                            # Check if organization has any of the requested SIC codes
+                            if not wanted_sic_codes.isdisjoint(str(s) for s in org_sic_codes):
+                                filtered_people.append(person)
+                            else:
+                                logger.warning(f"⚠️ Filtered out lead {person.get('name', 'Unknown')} - Organization SIC codes {org_sic_codes} don't match requested {sic_codes}")
+                        people = filtered_people
+                        logger.info(f"✅ After SIC code validation: {len(people)} leads match SIC codes {sic_codes}")
 
-                all_people.extend(people)
+                    return people
+                
+                except Exception as e:
+                    logger.error(f"❌ Apollo Search Error Page {page}: {e}")
+                    self.dropped_search_pages.append(page)
+                    return []
 
-                if len(all_people) >= total_leads_wanted:
-                    break
-            
-            except Exception as e:
-                logger.error(f"❌ Apollo Search Error Page {page}: {e}")
-                continue
+        # Pages are independent - fetch them concurrently, then stitch back in page order
+        pages = await asyncio.gather(*(
+            _fetch_page(page, min(leads_per_page, total_leads_wanted - (page - 1) * leads_per_page))
+            for page in range(1, total_pages + 1)
+        ))
+        
+        if self.dropped_search_pages:
+            self.dropped_search_pages.sort()
+            logger.error(
+                f"❌ Apollo Search: {len(self.dropped_search_pages)}/{total_pages} pages dropped "
+                f"after retries: {self.dropped_search_pages}"
+            )
+        
+        # Pages can overlap (pagination drift) - drop repeats so nobody is enriched twice
+        all_people = []
+        seen = set()
+        for people in pages:
+            for person in people:
+                key = _enrich_cache_key(person) or person.get("name")
+                if key:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                all_people.append(person)
+        
+        duplicates = sum(len(people) for people in pages) - len(all_people)
+        if duplicates:
+            logger.info(f"Apollo Search: Dropped {duplicates} duplicate leads across pages")
         
         logger.info(f"Apollo Search: Total leads collected: {len(all_people)}")
         return all_people[:total_leads_wanted]
 
+    def _parse_leads(
+        self,
+        search_results: List[Dict[str, Any]],
+        enriched_people: List[Optional[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """ Parse enriched people, falling back to basic search data where enrichment is missing """
+        leads = []
+        for person_data, enriched_person in zip(search_results, enriched_people):
+            if enriched_person:
+                # Parse enriched data
+                leads.append(self.parse_apollo_response(enriched_person))
+            else:
+                # Fallback to basic data if enrichment fails (or is disabled)
+                leads.append(self.parse_apollo_response(person_data))
+        return leads
+    
     def parse_apollo_response(self, person: Dict[str, Any]) -> Dict[str, Any]:
         """ Parse Apollo person data into scraped_data format """
         org = person.get("organization") or {}
-        
-        # ENHANCED Email extraction logic
-        email = None
-        
-        # Priority 1: Direct email field (from enrichment)
-        if person.get("email"):
-            email = person["email"]
-        
-        # Priority 2: Personal emails list
-        elif person.get("personal_emails") and len(person["personal_emails"]) > 0:
-            email = person["personal_emails"][0]
-        
-        # Priority 3: Corporate email
-        elif person.get("corporate_email"):
-            email = person["corporate_email"]
-        
-        # Priority 4: Fallback to personal_email field
-        elif person.get("personal_email"):
-            email = person["personal_email"]
+        location = org.get("primary_location") or {}
+        
+        # ENHANCED Email extraction logic - first non-empty source wins:
+        # 1. Direct email field (from enrichment)
+        # 2. Personal emails list
+        # 3. Corporate email
+        # 4. Fallback to personal_email field
+        email = next(
+            (
+                value for value in (
+                    person.get("email"),
+                    (person.get("personal_emails") or [None])[0],
+                    person.get("corporate_email"),
+                    person.get("personal_email"),
+                )
+                if value
+            ),
+            None
+        )
         
         # Phone extraction DISABLED per user request
         phone = None
@@ -557,24 +617,26 @@ class ApolloService:
         company_website = org.get("website_url")
         company_domain = None
         if company_website:
-            # Remove protocol and path to get domain
-            import re
-            domain = re.sub(r'^https?://', '', company_website)
-            domain = re.sub(r'/.*$', '', domain)
-            company_domain = domain
+            # Remove protocol and path to get domain. Same result as the old
+            # re.sub pair (case and any port are kept) so stored domains, used for
+            # dedup and website scraping, don't change
+            domain = company_website
+            if domain.startswith(("http://", "https://")):
+                domain = domain.split("://", 1)[1]
+            company_domain = domain.split("/", 1)[0]
             
         return {
             "founder_name": person.get("name"),
             "founder_email": email,
             "founder_linkedin": person.get("linkedin_url"),
             "position": person.get("title"),
-            "founder_address": person.get("formatted_address") or org.get("primary_location", {}).get("formatted_address"),
+            "founder_address": person.get("formatted_address") or location.get("formatted_address"),
             "company_name": org.get("name"),
             "company_website": company_website,
             "company_domain": company_domain,
             "company_linkedin": org.get("linkedin_url"),
             "company_industry": org.get("industry") or person.get("industry"),
-            "company_country": org.get("primary_location", {}).get("country"),
+            "company_country": location.get("country"),
             "mail_status": "pending", # Default status for new leads
             "is_verified": True # We filter for verified emails only
         }
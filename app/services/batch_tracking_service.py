@@ -1,21 +1,39 @@
 """
 Batch tracking service for monitoring email sending progress.
 Allows tracking, resuming, and monitoring batch operations.
+
+NOTE: not used by the live send path - batch tracking was removed from
+send_batch and the /leads batch endpoints (progress is logged only).
+Re-wire it there before relying on it; increment_progress also needs
+migrations/add_batch_progress_increment.sql.
 """
 
 from typing import Dict, Any, Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from supabase import Client
+import asyncio
 import logging
+import threading
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# update_progress() writes to Supabase every N processed leads or after this long, whichever first
+PROGRESS_FLUSH_EVERY = 10
+PROGRESS_FLUSH_INTERVAL_SECONDS = 2.0
+
 class BatchTrackingService:
     """Service for tracking email batch progress"""
     
     def __init__(self, db: Client):
         self.db = db
+        # Latest unwritten progress counts per batch (coalesced by update_progress)
+        self._pending_progress: Dict[str, Dict[str, int]] = {}
+        self._last_flush: Dict[str, float] = {}
+        # AsyncBatchTrackingService calls in from worker threads. Held across the
+        # progress writes too, so an older count can never land after a newer one.
+        self._progress_lock = threading.Lock()
     
     def create_batch(
         self,
@@ -63,6 +81,8 @@ class BatchTrackingService:
     ) -> bool:
         """
         Update batch progress.
+        Counts are buffered and written every PROGRESS_FLUSH_EVERY leads or
+        PROGRESS_FLUSH_INTERVAL_SECONDS; mark_complete/cancel_batch write any remainder.
         
         Args:
             batch_id: Batch UUID
@@ -72,29 +92,92 @@ class BatchTrackingService:
             skipped: Skipped leads
         
         Returns:
-            True if updated successfully
+            True if buffered or updated successfully
         """
-        try:
-            update_data = {
+        with self._progress_lock:
+            self._pending_progress[batch_id] = {
                 "processed_count": processed,
                 "success_count": success,
                 "failed_count": failed,
                 "skipped_count": skipped
             }
             
-            self.db.table("email_batches").update(update_data).eq("id", batch_id).execute()
-            
-            # Log progress every 10 leads
-            if processed % 10 == 0:
-                logger.info(
-                    f"📊 Batch {batch_id}: {processed} processed "
-                    f"({success} success, {failed} failed, {skipped} skipped)"
-                )
+            last_flush = self._last_flush.setdefault(batch_id, time.monotonic())
+            if processed % PROGRESS_FLUSH_EVERY != 0 and time.monotonic() - last_flush < PROGRESS_FLUSH_INTERVAL_SECONDS:
+                return True
+        
+        flushed = self.flush(batch_id)
+        
+        # Log progress every 10 leads
+        if flushed and processed % 10 == 0:
+            logger.info(
+                f"📊 Batch {batch_id}: {processed} processed "
+                f"({success} success, {failed} failed, {skipped} skipped)"
+            )
+        
+        return flushed
+    
+    def flush(self, batch_id: str) -> bool:
+        """
+        Write buffered progress counts for a batch, if any.
+        
+        Args:
+            batch_id: Batch UUID
+        
+        Returns:
+            True if nothing was pending or the write succeeded
+        """
+        with self._progress_lock:
+            update_data = self._pending_progress.pop(batch_id, None)
+            if not update_data:
+                return True
             
+            try:
+                self.db.table("email_batches").update(update_data).eq("id", batch_id).execute()
+                self._last_flush[batch_id] = time.monotonic()
+                return True
+                
+            except Exception as e:
+                # Keep the counts so the next flush retries them
+                self._pending_progress.setdefault(batch_id, update_data)
+                logger.error(f"Error updating batch progress: {e}")
+                return False
+    
+    def increment_progress(
+        self,
+        batch_id: str,
+        processed: int = 0,
+        success: int = 0,
+        failed: int = 0,
+        skipped: int = 0
+    ) -> bool:
+        """
+        Atomically add progress deltas via the increment_batch_progress RPC
+        (see migrations/add_batch_progress_increment.sql). Safe for concurrent
+        workers reporting on the same batch, unlike update_progress's absolute counts.
+        
+        Args:
+            batch_id: Batch UUID
+            processed: Leads processed since the last call
+            success: Successful sends since the last call
+            failed: Failed sends since the last call
+            skipped: Skipped leads since the last call
+        
+        Returns:
+            True if updated successfully
+        """
+        try:
+            self.db.rpc("increment_batch_progress", {
+                "p_batch_id": batch_id,
+                "d_processed": processed,
+                "d_success": success,
+                "d_failed": failed,
+                "d_skipped": skipped
+            }).execute()
             return True
             
         except Exception as e:
-            logger.error(f"Error updating batch progress: {e}")
+            logger.error(f"Error incrementing batch progress: {e}")
             return False
     
     def mark_complete(
@@ -117,13 +200,18 @@ class BatchTrackingService:
         try:
             update_data = {
                 "status": "completed" if success else "failed",
-                "completed_at": datetime.utcnow().isoformat()
+                "completed_at": datetime.now(timezone.utc).isoformat(timespec="seconds")
             }
             
             if error_message:
                 update_data["error_message"] = error_message
             
-            self.db.table("email_batches").update(update_data).eq("id", batch_id).execute()
+            # Fold any buffered progress into the same write
+            with self._progress_lock:
+                update_data.update(self._pending_progress.pop(batch_id, {}))
+                self._last_flush.pop(batch_id, None)
+                
+                self.db.table("email_batches").update(update_data).eq("id", batch_id).execute()
             
             status_emoji = "✅" if success else "❌"
             logger.info(f"{status_emoji} Batch {batch_id} marked as {update_data['status']}")
@@ -247,10 +335,15 @@ class BatchTrackingService:
         try:
             update_data = {
                 "status": "cancelled",
-                "completed_at": datetime.utcnow().isoformat()
+                "completed_at": datetime.now(timezone.utc).isoformat(timespec="seconds")
             }
             
-            self.db.table("email_batches").update(update_data).eq("id", batch_id).execute()
+            # Fold any buffered progress into the same write
+            with self._progress_lock:
+                update_data.update(self._pending_progress.pop(batch_id, {}))
+                self._last_flush.pop(batch_id, None)
+                
+                self.db.table("email_batches").update(update_data).eq("id", batch_id).execute()
             
             logger.info(f"🛑 Batch {batch_id} cancelled")
             return True
@@ -258,3 +351,53 @@ class BatchTrackingService:
         except Exception as e:
             logger.error(f"Error cancelling batch: {e}")
             return False
+
+class AsyncBatchTrackingService:
+    """
+    Async facade over BatchTrackingService for use from async send paths.
+    Each call runs the blocking Supabase request in a worker thread so the
+    event loop keeps serving other tasks (Apollo enrichment, webhook sends).
+    """
+    
+    def __init__(self, db: Client):
+        self.sync = BatchTrackingService(db)
+    
+    async def create_batch(self, total_leads: int, metadata: Optional[Dict] = None) -> str:
+        return await asyncio.to_thread(self.sync.create_batch, total_leads, metadata)
+    
+    async def update_progress(
+        self,
+        batch_id: str,
+        processed: int,
+        success: int,
+        failed: int,
+        skipped: int = 0
+    ) -> bool:
+        return await asyncio.to_thread(self.sync.update_progress, batch_id, processed, success, failed, skipped)
+    
+    async def increment_progress(
+        self,
+        batch_id: str,
+        processed: int = 0,
+        success: int = 0,
+        failed: int = 0,
+        skipped: int = 0
+    ) -> bool:
+        return await asyncio.to_thread(self.sync.increment_progress, batch_id, processed, success, failed, skipped)
+    
+    async def flush(self, batch_id: str) -> bool:
+        return await asyncio.to_thread(self.sync.flush, batch_id)
+    
+    async def mark_complete(
+        self,
+        batch_id: str,
+        success: bool = True,
+        error_message: Optional[str] = None
+    ) -> bool:
+        return await asyncio.to_thread(self.sync.mark_complete, batch_id, success, error_message)
+    
+    async def cancel_batch(self, batch_id: str) -> bool:
+        return await asyncio.to_thread(self.sync.cancel_batch, batch_id)
+    
+    async def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.sync.get_batch_status, batch_id)
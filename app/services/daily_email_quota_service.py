@@ -1,41 +1,89 @@
 import logging
+import threading
+import time
 from datetime import date, datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from supabase import Client
 
 logger = logging.getLogger(__name__)
 
+# How long today's quota row is served from memory before re-reading it
+QUOTA_CACHE_TTL_SECONDS = 5.0
+
+# How long a get_next_batch_leads result is reused for repeat polls
+NEXT_BATCH_CACHE_TTL_SECONDS = 2.0
+
+# Narrow column set for get_next_batch_leads callers that only need to address and
+# personalize an email (pass columns=BATCH_LEAD_COLUMNS to skip the wide text columns)
+BATCH_LEAD_COLUMNS = "id,founder_email,founder_name,company_name,company_website"
+
 class DailyEmailQuotaService:
-    """Service to manage daily email sending quota (400 emails/day)"""
+    """
+    Service to manage daily email sending quota (400 emails/day)
+    
+    NOTE: nothing in app/ or scripts/ uses this yet - the live send path picks
+    leads with SimplifiedEmailTrackingService and has no daily quota. Wire it into
+    send_batch before relying on it; increment_sent_count and claim_next_batch_leads
+    also need migrations/add_daily_quota_increment.sql and add_claim_next_email_batch.sql.
+    """
     
-    def __init__(self, db: Client, daily_limit: int = 400):
+    def __init__(self, db: Client, daily_limit: int = 400, cache_full_batches: bool = True):
         self.db = db
         self.daily_limit = daily_limit
+        # Full batches are only worth reusing when a single worker claims leads;
+        # with several workers set this False so only partial (tail) batches are cached
+        self.cache_full_batches = cache_full_batches
+        # (date, fetched_at monotonic, row) - get_remaining_quota/can_send_emails/
+        # increment_sent_count all read today's row, so keep it for a few seconds
+        self._quota_cache: Optional[Tuple[date, float, Dict]] = None
+        self._quota_lock = threading.Lock()
+        # ((today, batch_size, columns), fetched_at monotonic, leads) - a poll loop
+        # calling get_next_batch_leads back to back would otherwise re-run the same scan
+        self._leads_cache: Optional[Tuple[Tuple, float, list]] = None
+        self._leads_lock = threading.Lock()
+    
+    def _invalidate_quota_cache(self):
+        with self._quota_lock:
+            self._quota_cache = None
+    
+    def _invalidate_leads_cache(self):
+        with self._leads_lock:
+            self._leads_cache = None
     
     def get_today_quota(self) -> Dict:
         """Get today's quota information"""
         today = date.today()
+        today_str = str(today)
+        
+        with self._quota_lock:
+            cached = self._quota_cache
+            if cached and cached[0] == today and time.monotonic() - cached[1] < QUOTA_CACHE_TTL_SECONDS:
+                return dict(cached[2])
         
         try:
             # Try to get today's quota record
-            result = self.db.table("daily_email_quota").select("*").eq("date", str(today)).execute()
+            result = self.db.table("daily_email_quota").select("id,date,emails_sent,quota_limit").eq("date", today_str).execute()
             
             if result.data and len(result.data) > 0:
-                return result.data[0]
+                quota = result.data[0]
             else:
                 # Create today's quota record
                 new_quota = {
-                    "date": str(today),
+                    "date": today_str,
                     "emails_sent": 0,
                     "quota_limit": self.daily_limit
                 }
                 result = self.db.table("daily_email_quota").insert(new_quota).execute()
-                return result.data[0] if result.data else new_quota
+                quota = result.data[0] if result.data else new_quota
+            
+            with self._quota_lock:
+                self._quota_cache = (today, time.monotonic(), quota)
+            return dict(quota)
                 
         except Exception as e:
             logger.error(f"Error getting today's quota: {e}")
             return {
-                "date": str(today),
+                "date": today_str,
                 "emails_sent": 0,
                 "quota_limit": self.daily_limit
             }
@@ -52,18 +100,30 @@ class DailyEmailQuotaService:
         return remaining >= count
     
     def increment_sent_count(self, count: int = 1) -> bool:
-        """Increment the sent email count for today"""
+        """
+        Increment the sent email count for today.
+        Uses the increment_daily_quota RPC (see migrations/add_daily_quota_increment.sql)
+        so the add happens in Postgres - one round trip and no lost updates between senders.
+        """
         today = date.today()
+        today_str = str(today)
         
         try:
-            quota = self.get_today_quota()
-            new_count = quota.get("emails_sent", 0) + count
+            result = self.db.rpc("increment_daily_quota", {
+                "p_date": today_str,
+                "p_count": count,
+                "p_limit": self.daily_limit
+            }).execute()
             
-            self.db.table("daily_email_quota").update({
-                "emails_sent": new_count
-            }).eq("date", str(today)).execute()
-            
-            logger.info(f"📊 Daily quota updated: {new_count}/{self.daily_limit} emails sent today")
+            quota = result.data[0] if result.data else None
+            if quota:
+                # The RPC returns the updated row - use it as the fresh cached value
+                with self._quota_lock:
+                    self._quota_cache = (today, time.monotonic(), quota)
+                logger.info(f"📊 Daily quota updated: {quota.get('emails_sent')}/{quota.get('quota_limit', self.daily_limit)} emails sent today")
+            else:
+                self._invalidate_quota_cache()
+                logger.info(f"📊 Daily quota incremented by {count}")
             return True
             
         except Exception as e:
@@ -76,43 +136,83 @@ class DailyEmailQuotaService:
             # Delete records older than 7 days
             seven_days_ago = date.today() - timedelta(days=7)
             self.db.table("daily_email_quota").delete().lt("date", str(seven_days_ago)).execute()
+            self._invalidate_quota_cache()
             return True
         except Exception as e:
             logger.error(f"Error resetting quota: {e}")
             return False
     
-    def get_next_batch_leads(self, batch_size: int = 400) -> list:
+    def get_next_batch_leads(self, batch_size: int = 400, columns: str = "*") -> list:
         """
         Get the next batch of leads that haven't been processed today.
         Returns up to batch_size leads that have valid emails and haven't been processed in today's batch.
+        Full rows by default; pass `columns` (e.g. BATCH_LEAD_COLUMNS) to select less.
         """
-        today = date.today()
+        today_str = str(date.today())
+        cache_key = (today_str, batch_size, columns)
+        
+        with self._leads_lock:
+            cached = self._leads_cache
+            if cached and cached[0] == cache_key and time.monotonic() - cached[1] < NEXT_BATCH_CACHE_TTL_SECONDS:
+                return [dict(lead) for lead in cached[2]]
         
         try:
             # Get leads that:
             # 1. Have founder_email (not null/empty)
             # 2. Haven't been processed in today's batch OR were processed on a different day
-            result = self.db.table("scraped_data").select("*").or_(
-                f"email_batch_processed.is.null,email_batch_processed.eq.false,email_batch_date.neq.{today}"
+            result = self.db.table("scraped_data").select(columns).or_(
+                f"email_batch_processed.is.null,email_batch_processed.eq.false,email_batch_date.neq.{today_str}"
             ).not_.is_("founder_email", "null").neq("founder_email", "").limit(batch_size).execute()
             
-            return result.data if result.data else []
+            leads = result.data if result.data else []
+            
+            if len(leads) < batch_size or self.cache_full_batches:
+                with self._leads_lock:
+                    self._leads_cache = (cache_key, time.monotonic(), leads)
+            # Copies, so a caller editing a lead can't change what the next poll gets
+            return [dict(lead) for lead in leads]
             
         except Exception as e:
             logger.error(f"Error getting next batch leads: {e}")
             return []
     
+    def claim_next_batch_leads(self, batch_size: int = 400) -> list:
+        """
+        Get the next batch of leads and mark them as processed for today in one step.
+        Uses the claim_next_email_batch RPC (see migrations/add_claim_next_email_batch.sql):
+        one round trip instead of get_next_batch_leads + mark_leads_as_processed, and
+        rows locked by a concurrent claim are skipped so no lead is handed out twice.
+        """
+        today_str = str(date.today())
+        
+        try:
+            result = self.db.rpc("claim_next_email_batch", {
+                "p_limit": batch_size,
+                "p_today": today_str
+            }).execute()
+            
+            leads = result.data if result.data else []
+            self._invalidate_leads_cache()
+            logger.info(f"✅ Claimed {len(leads)} leads for {today_str}'s batch")
+            return leads
+            
+        except Exception as e:
+            logger.error(f"Error claiming next batch leads: {e}")
+            return []
+    
     def mark_leads_as_processed(self, lead_ids: list) -> bool:
         """Mark leads as processed for today's batch"""
-        today = date.today()
+        today_str = str(date.today())
         
         try:
             self.db.table("scraped_data").update({
                 "email_batch_processed": True,
-                "email_batch_date": str(today)
+                "email_batch_date": today_str
             }).in_("id", lead_ids).execute()
+            # These leads no longer match the next-batch filter
+            self._invalidate_leads_cache()
             
-            logger.info(f"✅ Marked {len(lead_ids)} leads as processed for {today}")
+            logger.info(f"✅ Marked {len(lead_ids)} leads as processed for {today_str}")
             return True
             
         except Exception as e:
@@ -121,7 +221,8 @@ class DailyEmailQuotaService:
     
     def reset_daily_batch_flags(self) -> bool:
         """Reset all batch flags for a new day (call this at midnight or start of day)"""
-        yesterday = date.today() - timedelta(days=1)
+        today = date.today()
+        yesterday = today - timedelta(days=1)
         
         try:
             # Reset flags for leads processed yesterday or earlier
@@ -129,8 +230,9 @@ class DailyEmailQuotaService:
                 "email_batch_processed": False,
                 "email_batch_date": None
             }).lte("email_batch_date", str(yesterday)).execute()
+            self._invalidate_leads_cache()
             
-            logger.info(f"🔄 Reset batch flags for leads processed before {date.today()}")
+            logger.info(f"🔄 Reset batch flags for leads processed before {today}")
             return True
             
         except Exception as e:
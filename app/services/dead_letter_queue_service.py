@@ -4,14 +4,28 @@ Automatically retries failed emails with exponential backoff.
 Rewritten to use scraped_data table directly in the simplified architecture.
 """
 
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime, timedelta, timezone
 from supabase import Client
+from app.core.database import execute_async
+import asyncio
 import logging
+import re
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# Max DLQ retries in flight at once (sends are still paced by the gmail rate limiter)
+DLQ_RETRY_CONCURRENCY = 5
+
+# DLQ error_message format is "<error_type>: <error>" - dlq_stats_summary groups on the prefix
+_ERROR_TYPE_PREFIX = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*): ")
+
+def _dlq_error_type(error_message: Optional[str]) -> str:
+    """error_type prefix of a DLQ error_message ("unknown" if it has none)"""
+    match = _ERROR_TYPE_PREFIX.match(error_message or "")
+    return match.group(1) if match else "unknown"
+
 class DeadLetterQueueService:
     """Service for managing failed email attempts and retries using scraped_data"""
     
@@ -45,7 +59,7 @@ class DeadLetterQueueService:
         """
         try:
             # Calculate next retry time (1 hour from now for first attempt)
-            next_retry = datetime.utcnow() + timedelta(seconds=self.retry_delays[0])
+            next_retry = datetime.now(timezone.utc) + timedelta(seconds=self.retry_delays[0])
             
             # Update scraped_data
             # We use retry_count = 1 for the first failure
@@ -69,6 +83,56 @@ class DeadLetterQueueService:
             logger.error(f"Failed to add email to DLQ: {e}", exc_info=True)
             return None
     
+    async def add_failed_emails(self, failures: List[Dict[str, Any]]) -> int:
+        """
+        Mark several failed emails at once.
+        Failures sharing the same error message are written with a single
+        UPDATE ... WHERE id IN (...); if a grouped write fails, each lead in
+        that group falls back to add_failed_email so no failure is dropped.
+        
+        Args:
+            failures: Dicts with the add_failed_email keyword arguments
+                (lead_id, email_to, subject, body, error, error_type)
+        
+        Returns:
+            Number of leads recorded in the DLQ
+        """
+        if not failures:
+            return 0
+        
+        next_retry = datetime.now(timezone.utc) + timedelta(seconds=self.retry_delays[0])
+        
+        # Group by error message - one round trip per distinct error
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for failure in failures:
+            error_message = f"{failure.get('error_type', 'unknown')}: {str(failure.get('error'))}"
+            groups.setdefault(error_message, []).append(failure)
+        
+        recorded = 0
+        for error_message, group in groups.items():
+            lead_ids = [f["lead_id"] for f in group]
+            try:
+                await execute_async(
+                    self.db.table("scraped_data").update({
+                        "mail_status": "failed",
+                        "error_message": error_message,
+                        "retry_count": 1,
+                        "next_retry_at": next_retry.isoformat()
+                    }).in_("id", lead_ids)
+                )
+                recorded += len(lead_ids)
+            except Exception as e:
+                logger.error(f"Batched DLQ write failed for {len(lead_ids)} leads, falling back to per-lead writes: {e}")
+                for failure in group:
+                    if await self.add_failed_email(**failure):
+                        recorded += 1
+        
+        logger.info(
+            f"📥 Added {recorded}/{len(failures)} failed emails to DLQ (scraped_data) "
+            f"(Retry at: {next_retry})"
+        )
+        return recorded
+    
     async def retry_failed_emails(self) -> Dict[str, Any]:
         """
         Retry all pending failed emails that are ready for retry.
@@ -80,7 +144,8 @@ class DeadLetterQueueService:
         try:
             logger.info("🔄 Processing dead letter queue (scraped_data)...")
             
-            now = datetime.utcnow().isoformat()
+            # One timestamp for the whole run - the due-lead filter and every reschedule use it
+            now = datetime.now(timezone.utc)
             
             # Get emails ready for retry
             # mail_status = 'failed' AND next_retry_at <= now
@@ -88,7 +153,7 @@ class DeadLetterQueueService:
                 self.db.table("scraped_data")
                 .select("*")
                 .eq("mail_status", "failed")
-                .lte("next_retry_at", now)
+                .lte("next_retry_at", now.isoformat())
                 .execute()
             )
             
@@ -104,83 +169,22 @@ class DeadLetterQueueService:
             retry_emails = result.data
             logger.info(f"📬 Found {len(retry_emails)} emails ready for retry")
             
-            processed = 0
-            succeeded = 0
-            failed = 0
-            
             # Import here to avoid circular dependency
             from app.services.email_sending_service import EmailSendingService
             email_service = EmailSendingService(self.db)
             
-            for lead in retry_emails:
-                try:
-                    lead_id = lead["id"]
-                    retry_count = lead.get("retry_count", 0) or 0
-                    
-                    # Mark as processing/retrying (optional, but good for locking)
-                    # We can just let EmailSendingService handle the update to 'email_sent' or 'failed'
-                    
-                    # Attempt to send email
-                    # We need to regenerate email content or use what's stored?
-                    # EmailSendingService.send_email_to_lead generates content.
-                    # Let's use that.
-                    
-                    logger.info(f"🔄 Retrying lead {lead_id} (Attempt {retry_count + 1})")
-                    
-                    result = await email_service.send_email_to_lead(
-                        lead_id=lead_id,
-                        email_type="initial" # Assuming initial for now, could be stored in DB
-                    )
-                    
-                    processed += 1
-                    
-                    if result.get("success"):
-                        # Success! EmailSendingService updates mail_status to 'email_sent'
-                        succeeded += 1
-                        logger.info(f"✅ DLQ retry succeeded for lead {lead_id}")
-                    else:
-                        # Failed again
-                        new_retry_count = retry_count + 1
-                        error_msg = result.get("error", "Unknown error")
-                        
-                        if new_retry_count >= self.max_attempts:
-                            # Max attempts reached - mark as permanently failed (bounced or just failed with no retry)
-                            self.db.table("scraped_data").update({
-                                "mail_status": "bounced", # Using 'bounced' as permanent failure state
-                                "error_message": f"Max retries reached. Last error: {error_msg}",
-                                "retry_count": new_retry_count,
-                                "next_retry_at": None # No more retries
-                            }).eq("id", lead_id).execute()
-                            
-                            failed += 1
-                            logger.warning(
-                                f"❌ DLQ max attempts reached for lead {lead_id} "
-                                f"({new_retry_count}/{self.max_attempts})"
-                            )
-                        else:
-                            # Schedule next retry
-                            delay_index = min(new_retry_count - 1, len(self.retry_delays) - 1)
-                            next_retry = datetime.utcnow() + timedelta(
-                                seconds=self.retry_delays[delay_index]
-                            )
-                            
-                            self.db.table("scraped_data").update({
-                                "mail_status": "failed",
-                                "error_message": error_msg,
-                                "retry_count": new_retry_count,
-                                "next_retry_at": next_retry.isoformat()
-                            }).eq("id", lead_id).execute()
-                            
-                            failed += 1
-                            logger.info(
-                                f"⏳ DLQ retry failed, rescheduled lead {lead_id} "
-                                f"(Attempt {new_retry_count}/{self.max_attempts}, "
-                                f"Next retry: {next_retry})"
-                            )
-                
-                except Exception as e:
-                    logger.error(f"Error retrying DLQ lead {lead.get('id')}: {e}")
-                    failed += 1
+            semaphore = asyncio.Semaphore(DLQ_RETRY_CONCURRENCY)
+            results = await asyncio.gather(
+                *(self._retry_one(email_service, lead, semaphore, now) for lead in retry_emails)
+            )
+            outcomes = [outcome for outcome, _ in results]
+            
+            # Write the reschedule/bounce states collected above in as few round trips as possible
+            await self._write_retry_updates([update for _, update in results if update])
+            
+            succeeded = outcomes.count("succeeded")
+            processed = succeeded + outcomes.count("failed")
+            failed = len(outcomes) - succeeded
             
             logger.info(
                 f"📊 DLQ processing complete: {processed} processed, "
@@ -204,25 +208,161 @@ class DeadLetterQueueService:
                 "failed": 0
             }
     
+    async def _retry_one(
+        self,
+        email_service,
+        lead: Dict[str, Any],
+        semaphore: asyncio.Semaphore,
+        now: datetime
+    ) -> Tuple[str, Optional[Tuple[str, Dict[str, Any]]]]:
+        """
+        Retry a single DLQ lead. Nothing is written here - a failed retry
+        returns the (lead_id, update) pair for _write_retry_updates.
+        
+        Returns:
+            (outcome, update) where outcome is "succeeded", "failed" (rescheduled
+            or bounced) or "error" (unexpected exception)
+        """
+        async with semaphore:
+            try:
+                lead_id = lead["id"]
+                retry_count = lead.get("retry_count", 0) or 0
+                
+                # Attempt to send email
+                # EmailSendingService.send_email_to_lead generates content.
+                logger.info(f"🔄 Retrying lead {lead_id} (Attempt {retry_count + 1})")
+                
+                result = await email_service.send_email_to_lead(
+                    lead_id=lead_id,
+                    email_type="initial" # Assuming initial for now, could be stored in DB
+                )
+                
+                if result.get("success"):
+                    # Success! EmailSendingService updates mail_status to 'email_sent'
+                    logger.info(f"✅ DLQ retry succeeded for lead {lead_id}")
+                    return "succeeded", None
+                
+                # Failed again
+                new_retry_count = retry_count + 1
+                error_msg = result.get("error", "Unknown error")
+                # Keep the type the lead entered the DLQ with so stats stay grouped by it
+                error_type = _dlq_error_type(lead.get("error_message"))
+                
+                if new_retry_count >= self.max_attempts:
+                    logger.warning(
+                        f"❌ DLQ max attempts reached for lead {lead_id} "
+                        f"({new_retry_count}/{self.max_attempts})"
+                    )
+                    return "failed", (lead_id, self._bounced_update(new_retry_count, error_type, error_msg))
+                
+                update = self._reschedule_update(new_retry_count, error_type, error_msg, now)
+                logger.info(
+                    f"⏳ DLQ retry failed, rescheduling lead {lead_id} "
+                    f"(Attempt {new_retry_count}/{self.max_attempts}, "
+                    f"Next retry: {update['next_retry_at']})"
+                )
+                return "failed", (lead_id, update)
+            
+            except Exception as e:
+                logger.error(f"Error retrying DLQ lead {lead.get('id')}: {e}")
+                return "error", None
+    
+    def _bounced_update(self, retry_count: int, error_type: str, error_msg: str) -> Dict[str, Any]:
+        """Update marking a lead as permanently failed (max attempts reached)"""
+        return {
+            "mail_status": "bounced", # Using 'bounced' as permanent failure state
+            "error_message": f"{error_type}: Max retries reached. Last error: {error_msg}",
+            "retry_count": retry_count,
+            "next_retry_at": None # No more retries
+        }
+    
+    def _reschedule_update(self, retry_count: int, error_type: str, error_msg: str, now: datetime) -> Dict[str, Any]:
+        """
+        Update scheduling the next retry for a lead.
+        `now` is the start of the DLQ run, so leads failing in the same run share a payload.
+        """
+        delay_index = min(retry_count - 1, len(self.retry_delays) - 1)
+        next_retry = now + timedelta(seconds=self.retry_delays[delay_index])
+        return {
+            "mail_status": "failed",
+            "error_message": f"{error_type}: {error_msg}",
+            "retry_count": retry_count,
+            "next_retry_at": next_retry.isoformat()
+        }
+    
+    async def _write_retry_updates(self, updates: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Persist DLQ retry outcomes.
+        Leads with an identical update payload (same status, error, attempt
+        and retry time) are written with a single UPDATE ... WHERE id IN (...);
+        if a grouped write fails, each lead in that group is written on its own.
+        """
+        groups: Dict[Tuple, Tuple[Dict[str, Any], List[str]]] = {}
+        for lead_id, update in updates:
+            key = tuple(sorted(update.items()))
+            groups.setdefault(key, (update, []))[1].append(lead_id)
+        
+        for update, lead_ids in groups.values():
+            try:
+                await execute_async(self.db.table("scraped_data").update(update).in_("id", lead_ids))
+            except Exception as e:
+                logger.error(f"Batched DLQ retry write failed for {len(lead_ids)} leads, falling back to per-lead writes: {e}")
+                for lead_id in lead_ids:
+                    try:
+                        await execute_async(self.db.table("scraped_data").update(update).eq("id", lead_id))
+                    except Exception as e:
+                        logger.error(f"Failed to update DLQ state for lead {lead_id}: {e}")
+        
+        if updates:
+            logger.info(f"💾 Wrote DLQ state for {len(updates)} leads in {len(groups)} update(s)")
+    
     def get_dlq_stats(self) -> Dict[str, Any]:
-        """Get DLQ statistics from scraped_data"""
+        """
+        Get DLQ statistics from scraped_data.
+        Reads the pre-aggregated dlq_stats_summary view (see
+        migrations/add_dlq_stats_summary.sql); falls back to per-status
+        counts if the view doesn't exist.
+        """
         try:
-            # Count failed emails
-            failed_result = self.db.table("scraped_data").select("id", count="exact").eq("mail_status", "failed").execute()
-            total_failed = failed_result.count if failed_result.count else 0
+            try:
+                result = self.db.table("dlq_stats_summary").select("status,error_type,count").execute()
+            except Exception as e:
+                logger.warning(f"View dlq_stats_summary might not exist, falling back to scraped_data counts: {e}")
+                return self._count_dlq_stats()
             
-            # Count bounced (permanently failed)
-            bounced_result = self.db.table("scraped_data").select("id", count="exact").eq("mail_status", "bounced").execute()
-            total_bounced = bounced_result.count if bounced_result.count else 0
+            counts = {(row["status"], row["error_type"]): row["count"] for row in (result.data or [])}
+            total_failed = counts.get(("failed", None), 0)
             
             return {
                 "total_failed": total_failed,
                 "pending_retry": total_failed, # All 'failed' are pending retry unless max reached (which moves to bounced)
-                "permanently_failed": total_bounced,
+                "permanently_failed": counts.get(("bounced", None), 0),
                 "resolved": 0, # Hard to track resolved historically without separate table
-                "by_error_type": {} # Not easily available without group by query
+                "by_error_type": {
+                    error_type: count
+                    for (status, error_type), count in counts.items()
+                    if status is None and error_type is not None
+                }
             }
             
         except Exception as e:
             logger.error(f"Error getting DLQ stats: {e}")
             return {}
+    
+    def _count_dlq_stats(self) -> Dict[str, Any]:
+        """DLQ statistics from direct count queries (no error type breakdown)"""
+        # Count failed emails
+        failed_result = self.db.table("scraped_data").select("id", count="exact").eq("mail_status", "failed").execute()
+        total_failed = failed_result.count if failed_result.count else 0
+        
+        # Count bounced (permanently failed)
+        bounced_result = self.db.table("scraped_data").select("id", count="exact").eq("mail_status", "bounced").execute()
+        total_bounced = bounced_result.count if bounced_result.count else 0
+        
+        return {
+            "total_failed": total_failed,
+            "pending_retry": total_failed,
+            "permanently_failed": total_bounced,
+            "resolved": 0,
+            "by_error_type": {} # Needs the dlq_stats_summary view
+        }
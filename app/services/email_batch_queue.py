@@ -0,0 +1,404 @@
+"""
+Email batch queue and worker pool.
+Batches submitted via /api/leads/send-emails are enqueued here and drained by
+a fixed number of workers, so the API process never spawns unbounded
+background tasks and callers get a job_id plus queue depth for backpressure.
+"""
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from supabase import Client
+from app.core.database import execute_async
+from app.services.website_service import WebsiteService
+from app.services.email_personalization_service import EmailPersonalizationService
+from app.services.timezone_service import TimezoneService
+from app.services.simplified_email_tracking_service import SimplifiedEmailTrackingService
+from app.services.dead_letter_queue_service import DeadLetterQueueService
+
+logger = logging.getLogger(__name__)
+
+_SEP = "=" * 80
+
+def _canonical_id(lead_id: Any) -> str:
+    """Canonical (lower-case, hyphenated) form of a UUID; other values are returned as-is"""
+    try:
+        return str(uuid.UUID(str(lead_id)))
+    except ValueError:
+        return str(lead_id)
+
+async def send_batch(lead_ids: List[str], db: Client):
+    """
+    Send emails to leads with batch tracking, DLQ, and timezone checks.
+    MAX 10 LEADS ENFORCED.
+    Per-lead failures are counted and logged; an unexpected error aborting the
+    whole batch is re-raised so the queue worker records the job as failed.
+    """
+    try:
+        # CRITICAL SAFETY CHECK: Enforce maximum 10 leads
+        MAX_LEADS = 10
+        if len(lead_ids) > MAX_LEADS:
+            logger.warning("⚠️ CRITICAL: Received %d lead_ids, limiting to %d for safety", len(lead_ids), MAX_LEADS)
+            lead_ids = lead_ids[:MAX_LEADS]
+        
+        logger.info(_SEP)
+        logger.info("🚀 STARTING EMAIL SENDING PROCESS for %d leads", len(lead_ids))
+        logger.info(_SEP)
+        
+        # Initialize services
+        tracking_service = SimplifiedEmailTrackingService(db, batch_size=10)
+        # batch_tracker = BatchTrackingService(db) # REMOVED
+        dlq_service = DeadLetterQueueService(db)
+        timezone_service = TimezoneService()
+        website_service = WebsiteService(db)
+        email_service = EmailPersonalizationService(db)
+        from app.services.email_sending_service import EmailSendingService
+        email_sending_service = EmailSendingService(db)
+        
+        # Batch tracking removed - using logging only
+        logger.info("📊 Processing batch of %d leads", len(lead_ids))
+        
+        # Batch offsets are no longer tracked (can_send_today always reports 0),
+        # so don't spend a Supabase round trip asking for one
+        next_batch_offset = 0
+        
+        processed = 0
+        failed = 0
+        skipped_timezone = 0
+        webhook_called = 0
+        emails_sent_count = 0
+        processed_lead_ids = []
+        skipped = 0
+        dlq_buffer: List[Dict[str, Any]] = []
+        
+        # Get lead data for the whole batch in one query (keeps lead_ids order)
+        leads_result = await execute_async(db.table("scraped_data").select("*").in_("id", lead_ids))
+        # Match on canonical UUID strings - callers may send upper-case or unhyphenated ids
+        rows = {_canonical_id(row["id"]): row for row in (leads_result.data or [])}
+        by_id = {}
+        missing = []
+        for lead_id in lead_ids:
+            row = rows.get(_canonical_id(lead_id))
+            if row is None:
+                missing.append(lead_id)
+            else:
+                by_id[str(row["id"])] = row
+        
+        if missing:
+            logger.warning("Leads not found: %s", missing)
+            skipped += len(missing)
+        
+        try:
+            for lead_id, lead in by_id.items():
+                try:
+                    company_website = lead.get("company_website", "")
+                    company_domain = None
+                    if company_website:
+                        company_domain = company_website.replace("https://", "").replace("http://", "").split("/")[0]
+                    company_country = lead.get("company_country")
+                
+                    # Step 1: Check timezone (Mon-Sat, 9 AM - 6 PM)
+                    timezone_check = timezone_service.check_lead_business_hours(
+                        country=company_country,
+                        start_hour=9,
+                        end_hour=18  # 6 PM
+                    )
+                
+                    is_business_hours = timezone_check.get("is_business_hours", False)
+                    should_queue = False
+                
+                    if not is_business_hours:
+                        logger.info("⏸️ Lead %s - Not in business hours. Queueing.", lead_id)
+                        skipped_timezone += 1
+                        should_queue = True
+                
+                    if should_queue:
+                        # Queued leads are scraped and generated at send time by
+                        # process_email_queue, so skip both steps here
+                        try:
+                            queue_result = await email_sending_service.queue_email_for_lead(
+                                lead_id=lead_id,
+                                email_type="initial",
+                                company_country=company_country
+                            )
+                            if not queue_result.get("success"):
+                                logger.warning("❌ Failed to queue email: %s", queue_result.get("error"))
+                        except Exception as e:
+                            logger.error("❌ Error queueing email: %s", e)
+                            failed += 1
+                    else:
+                        # Step 2: Scrape website
+                        if company_domain:
+                            try:
+                                scrape_result = await website_service.scrape_company_website(
+                                    company_domain=company_domain,
+                                    company_website=company_website
+                                )
+                            except Exception as e:
+                                logger.error("❌ Failed to scrape website for %s: %s", company_domain, e)
+                    
+                        # Step 3: Generate email
+                        try:
+                            email_result = await email_service.generate_email_for_lead(
+                                lead_id=lead_id,
+                                email_type="initial"
+                            )
+                        
+                            if email_result.get("success"):
+                                # Step 4: Send
+                                try:
+                                    send_result = await email_sending_service.send_email_to_lead(
+                                        lead_id=lead_id,
+                                        email_type="initial"
+                                    )
+                                
+                                    if send_result.get("success"):
+                                        logger.info("✅ Email sent for lead %s", lead_id)
+                                        webhook_called += 1
+                                        emails_sent_count += 1
+                                    else:
+                                        logger.warning("❌ Failed to send email: %s", send_result.get("error"))
+                                        # Add to DLQ (flushed once after the loop)
+                                        dlq_buffer.append({
+                                            "lead_id": lead_id,
+                                            "email_to": lead.get("founder_email"),
+                                            "subject": email_result.get("subject", ""),
+                                            "body": email_result.get("body", ""),
+                                            "error": Exception(send_result.get("error", "Unknown error")),
+                                            "error_type": "email_send_failed"
+                                        })
+                                except Exception as e:
+                                    logger.error("❌ Error sending email: %s", e)
+                                    failed += 1
+                            else:
+                                logger.warning("❌ Failed to generate email: %s", email_result.get("error"))
+                                failed += 1
+                        except Exception as e:
+                            logger.error("❌ Error generating email: %s", e)
+                            failed += 1
+                
+                    processed += 1
+                    processed_lead_ids.append(lead_id)
+                
+                    # Update batch progress - LOGGING ONLY
+                    if processed % 5 == 0:
+                        logger.info("📊 Progress: %d/%d processed, %d sent, %d failed", processed, len(lead_ids), emails_sent_count, failed)
+                
+                    # Rate limiting - sends are paced by the gmail limiter in EmailSendingService
+                    if should_queue:
+                        await asyncio.sleep(0.2)
+                
+                except Exception as e:
+                    logger.error("❌ Error processing lead %s: %s", lead_id, e, exc_info=True)
+                    failed += 1
+                    processed_lead_ids.append(lead_id)
+        finally:
+            # Runs on errors and cancellation too (stop() cancels workers mid-batch),
+            # so buffered failures and processed leads are never dropped
+            await _flush_batch_state(dlq_service, tracking_service, dlq_buffer, processed_lead_ids)
+        
+        # Record completion
+        tracking_service.record_send_completion(
+            batch_offset=next_batch_offset,
+            leads_processed=processed,
+            emails_sent=emails_sent_count
+        )
+        
+        # Mark batch complete - LOGGING ONLY
+        logger.info("✅ Batch processing complete")
+        
+        logger.info(_SEP)
+        logger.info("📊 Email sending completed: %d processed, %d sent", processed, emails_sent_count)
+        logger.info(_SEP)
+        
+    except Exception as e:
+        logger.error("❌ CRITICAL ERROR: %s", e, exc_info=True)
+        raise
+
+async def _flush_batch_state(
+    dlq_service: DeadLetterQueueService,
+    tracking_service: SimplifiedEmailTrackingService,
+    dlq_buffer: List[Dict[str, Any]],
+    processed_lead_ids: List[str]
+):
+    """Write a batch's buffered DLQ failures and mark its processed leads"""
+    # Flush send failures to the DLQ in one go
+    if dlq_buffer:
+        try:
+            await dlq_service.add_failed_emails(dlq_buffer)
+        except Exception as e:
+            logger.error("❌ Failed to flush %d DLQ entries: %s", len(dlq_buffer), e, exc_info=True)
+    
+    # Mark processed leads
+    if processed_lead_ids:
+        try:
+            await asyncio.to_thread(tracking_service.mark_leads_processed, processed_lead_ids)
+        except Exception as e:
+            logger.error("❌ Failed to mark %d leads processed: %s", len(processed_lead_ids), e, exc_info=True)
+
+class EmailBatchQueueFull(Exception):
+    """Raised when the batch queue is at capacity"""
+    pass
+
+class EmailBatchQueue:
+    """
+    Bounded in-process queue of email batches drained by a worker pool.
+    - enqueue() returns a job_id immediately
+    - Workers run send_batch() one batch at a time
+    - depth()/get_job() expose queue state to status endpoints
+    Jobs live in memory only: stop() releases the 'processing' lock on leads of
+    batches that never ran (or were cancelled mid-run) so the next automatic
+    batch picks them up again.
+    """
+    
+    def __init__(self, max_pending: int = 20, num_workers: int = 1, max_tracked_jobs: int = 100):
+        self.max_pending = max_pending
+        self.num_workers = num_workers
+        self.max_tracked_jobs = max_tracked_jobs
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    
+    def start(self):
+        """Start the worker pool (must be called from the running event loop)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"email-batch-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        logger.info("📬 Email batch queue started with %d worker(s)", self.num_workers)
+    
+    async def stop(self):
+        """
+        Cancel workers and drain batches that never ran.
+        Each dropped batch is logged with its lead_ids, and leads it had claimed
+        are released (cancelled in-flight batches release theirs in _worker).
+        """
+        if not self._workers:
+            return
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        
+        pending = 0
+        while not self._queue.empty():
+            job_id, lead_ids, db, claimed_leads = self._queue.get_nowait()
+            pending += 1
+            logger.warning("⚠️ Dropping unsent batch %s on shutdown, lead_ids: %s", job_id, lead_ids)
+            if job_id in self._jobs:
+                self._jobs[job_id]["status"] = "cancelled"
+            await self._release(job_id, db, claimed_leads)
+        if pending:
+            logger.warning("⚠️ Stopped email batch queue with %d pending batch(es)", pending)
+        
+        self._queue = None
+        logger.info("🛑 Email batch queue stopped")
+    
+    async def _release(self, job_id: str, db: Client, claimed_leads: Optional[List[Dict[str, Any]]]):
+        """Give a batch's automatically claimed leads back to the unsent pool"""
+        if not claimed_leads:
+            return
+        try:
+            tracking_service = SimplifiedEmailTrackingService(db, batch_size=10)
+            await asyncio.to_thread(tracking_service.release_leads, claimed_leads)
+        except Exception as e:
+            logger.error("❌ Failed to release leads for batch %s: %s", job_id, e)
+    
+    def enqueue(
+        self,
+        lead_ids: List[str],
+        db: Client,
+        claimed_leads: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        """
+        Enqueue a batch of lead IDs for sending.
+        
+        Args:
+            lead_ids: Leads to send to
+            db: Supabase client
+            claimed_leads: Rows locked by get_next_batch_leads for this batch,
+                released again if the batch is dropped before it runs
+        
+        Returns:
+            job_id (UUID string)
+        
+        Raises:
+            EmailBatchQueueFull: if max_pending batches are already waiting
+        """
+        if self._queue is None:
+            raise RuntimeError("Email batch queue is not running")
+        
+        job_id = str(uuid.uuid4())
+        try:
+            self._queue.put_nowait((job_id, lead_ids, db, claimed_leads))
+        except asyncio.QueueFull:
+            raise EmailBatchQueueFull(f"Email batch queue is full ({self.max_pending} batches pending)")
+        
+        self._track(job_id, {
+            "job_id": job_id,
+            "status": "queued",
+            "lead_count": len(lead_ids),
+            "queued_at": datetime.now(timezone.utc).isoformat()
+        })
+        logger.info("📥 Enqueued batch %s with %d leads (depth: %d)", job_id, len(lead_ids), self.depth())
+        return job_id
+    
+    def can_accept(self) -> bool:
+        """Whether enqueue() would currently accept a batch (running and not full)"""
+        return self._queue is not None and not self._queue.full()
+    
+    def depth(self) -> int:
+        """Number of batches waiting for a worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get tracked job state, or None if unknown/evicted"""
+        return self._jobs.get(job_id)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue statistics for status endpoints"""
+        return {
+            "running": bool(self._workers),
+            "workers": len(self._workers),
+            "queue_depth": self.depth(),
+            "max_pending": self.max_pending,
+            "active_jobs": sum(1 for j in self._jobs.values() if j["status"] == "running")
+        }
+    
+    def _track(self, job_id: str, job: Dict[str, Any]):
+        self._jobs[job_id] = job
+        # Keep memory bounded - evict oldest tracked jobs
+        while len(self._jobs) > self.max_tracked_jobs:
+            self._jobs.popitem(last=False)
+    
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id, lead_ids, db, claimed_leads = await self._queue.get()
+            job = self._jobs.get(job_id, {"job_id": job_id})
+            job["status"] = "running"
+            job["started_at"] = datetime.now(timezone.utc).isoformat()
+            try:
+                logger.info("⚙️ Worker %d picked up batch %s", worker_id, job_id)
+                await send_batch(lead_ids, db)
+                job["status"] = "completed"
+            except asyncio.CancelledError:
+                job["status"] = "cancelled"
+                # Leads not sent yet are still 'processing' - release_leads only touches those
+                logger.warning("⚠️ Batch %s cancelled mid-run, lead_ids: %s", job_id, lead_ids)
+                await self._release(job_id, db, claimed_leads)
+                raise
+            except Exception as e:
+                logger.error("❌ Worker %d failed batch %s: %s", worker_id, job_id, e, exc_info=True)
+                job["status"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = datetime.now(timezone.utc).isoformat()
+                self._queue.task_done()
+
+# Global email batch queue instance
+email_batch_queue = EmailBatchQueue()
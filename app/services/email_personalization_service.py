@@ -11,6 +11,15 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Frontend industry (lowercased) -> EMAIL_TEMPLATES key
+FRONTEND_INDUSTRY_MAPPING = {
+    "agrochemical": "Agrochemical",
+    "oil & gas": "Oil & Gas",
+    "oil and gas": "Oil & Gas",
+    "lubricant": "Lubricant",
+    "lubricants": "Lubricant"
+}
+
 class EmailPersonalizationService:
     """
     Service for generating personalized emails using OpenAI and website content
@@ -173,14 +182,7 @@ class EmailPersonalizationService:
                     frontend_industry = lead.get("company_industry", "").strip()
                     if frontend_industry:
                         # Map frontend industry to template industry
-                        industry_mapping = {
-                            "agrochemical": "Agrochemical",
-                            "oil & gas": "Oil & Gas",
-                            "oil and gas": "Oil & Gas",
-                            "lubricant": "Lubricant",
-                            "lubricants": "Lubricant"
-                        }
-                        industry = industry_mapping.get(frontend_industry.lower(), "Other")
+                        industry = FRONTEND_INDUSTRY_MAPPING.get(frontend_industry.lower(), "Other")
                         if industry != "Other":
                             logger.info(f"ℹ️ No website content available. Using industry from frontend: {frontend_industry} -> {industry}")
                         else:
@@ -7,6 +7,7 @@ from app.services.webhook_service import WebhookService
 from app.services.email_personalization_service import EmailPersonalizationService
 from app.services.timezone_service import TimezoneService
 from app.services.dead_letter_queue_service import DeadLetterQueueService
+from app.utils.retry_helper import retry_after_seconds
 from supabase import Client
 import logging
 import pytz
@@ -14,6 +15,10 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Webhook sends are retried only when the provider answers 429
+MAX_SEND_ATTEMPTS = 3
+MAX_RETRY_AFTER_SECONDS = 60.0
+
 class EmailSendingService:
     """
     Service for sending emails via n8n webhook and managing the email queue
@@ -116,18 +121,30 @@ class EmailSendingService:
             logger.info(f"📝 Subject: {subject[:100] if subject else 'None'}...")
             logger.info(f"📄 Body length: {len(body) if body else 0} characters")
             
-            # Send email data to n8n webhook
-            logger.info(f"🔄 About to call webhook_service.send_email_via_webhook...")
-            webhook_result = await self.webhook_service.send_email_via_webhook(
-                email_to=lead_email,
-                subject=subject,
-                body=body,
-                lead_id=lead_id,
-                email_type=email_type,
-                gmail_thread_id=gmail_thread_id,  # Pass gmail_thread_id for follow-ups
-                gmail_message_id=gmail_message_id  # Pass gmail_message_id for follow-ups
-            )
-            logger.info(f"🔄 Webhook service returned: {webhook_result}")
+            # Send email data to n8n webhook (gmail rate limit applies per send)
+            from app.core.rate_limiter import rate_limiter
+            webhook_result = None
+            for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+                await rate_limiter.acquire("gmail")
+                logger.info(f"🔄 About to call webhook_service.send_email_via_webhook...")
+                webhook_result = await self.webhook_service.send_email_via_webhook(
+                    email_to=lead_email,
+                    subject=subject,
+                    body=body,
+                    lead_id=lead_id,
+                    email_type=email_type,
+                    gmail_thread_id=gmail_thread_id,  # Pass gmail_thread_id for follow-ups
+                    gmail_message_id=gmail_message_id  # Pass gmail_message_id for follow-ups
+                )
+                logger.info(f"🔄 Webhook service returned: {webhook_result}")
+                
+                # Provider throttled us - honour Retry-After and try again
+                if webhook_result and webhook_result.get("status_code") == 429 and attempt < MAX_SEND_ATTEMPTS:
+                    wait_time = retry_after_seconds(webhook_result.get("retry_after"), attempt, MAX_RETRY_AFTER_SECONDS)
+                    logger.warning(f"⏳ Webhook rate limited (429) for lead {lead_id}. Retrying in {wait_time:.1f}s (attempt {attempt}/{MAX_SEND_ATTEMPTS})")
+                    await asyncio.sleep(wait_time)
+                    continue
+                break
 
             # Safety check: ensure webhook_result is not None
             if webhook_result is None:
@@ -372,8 +389,9 @@ class EmailSendingService:
                     # Update status to "sending"
                     self.db.table("scraped_data").update({"mail_status": "sending"}).eq("id", lead_id).execute()
                     
-                    # Rate limiting: Wait 1.5 seconds before sending
-                    await asyncio.sleep(1.5)
+                    # Rate limiting: shared gmail limiter instead of a fixed sleep
+                    from app.core.rate_limiter import rate_limiter
+                    await rate_limiter.acquire("gmail")
                     
                     # Generate email content (if not already stored - assuming dynamic generation for now)
                     # For scheduled emails, we might need to regenerate or store content. 
@@ -431,7 +449,7 @@ class EmailSendingService:
                         # Update status to failed
                         self.db.table("scraped_data").update({
                             "mail_status": "failed",
-                            "error_message": error_msg
+                            "error_message": f"webhook_error: {error_msg}"
                         }).eq("id", lead_id).execute()
                         
                         # Add to DLQ
@@ -456,7 +474,7 @@ class EmailSendingService:
                     try:
                         self.db.table("scraped_data").update({
                             "mail_status": "failed",
-                            "error_message": str(e)
+                            "error_message": f"queue_processing_error: {e}"
                         }).eq("id", lead.get("id")).execute()
                     except:
                         pass
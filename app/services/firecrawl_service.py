@@ -183,7 +183,7 @@ class FirecrawlService:
                 if timeout is not None:
                     payload["timeout"] = timeout
                 
-                logger.info(f"🌐 FIRECRAWL: Payload: {payload}")
+                logger.info("🌐 FIRECRAWL: Payload: %s", payload)
                 
                 # Make async HTTP request to Firecrawl v2 API
                 async with httpx.AsyncClient(timeout=60.0) as client:
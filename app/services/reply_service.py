@@ -158,7 +158,7 @@ class ReplyService:
             reply_subject = reply_data.get("reply_subject", "")
             
             logger.info(f"🔍 Starting analysis for lead {lead_id}: body_length={len(reply_body)}, subject={reply_subject[:50] if reply_subject else 'N/A'}")
-            logger.debug(f"📝 Full reply_data keys: {list(reply_data.keys())}")
+            logger.debug("📝 Full reply_data keys: %s", list(reply_data.keys()))
             
             if not reply_body:
                 logger.warning(f"⚠️ No reply body found for lead {lead_id}. Reply data: {reply_data}")
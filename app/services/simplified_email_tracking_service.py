@@ -78,6 +78,8 @@ class SimplifiedEmailTrackingService:
         - Haven't been sent yet (mail_status not in ['sent', 'email_sent'])
         - Have valid email addresses
         - Haven't been processed yet (email_processed = false/null)
+        Oldest leads first; served by the idx_scraped_unprocessed partial indexes
+        (migrations/add_unprocessed_leads_index.sql) - keep their predicates in sync.
         """
         try:
             # Get unprocessed, verified leads with valid emails that haven't been sent
@@ -89,6 +91,7 @@ class SimplifiedEmailTrackingService:
                 .not_.is_("founder_email", "null") \
                 .neq("founder_email", "") \
                 .not_.in_("mail_status", ["email_sent", "reply_received", "followup_10day_sent", "processing"]) \
+                .order("created_at") \
                 .limit(self.batch_size) \
                 .execute()
             
@@ -102,6 +105,7 @@ class SimplifiedEmailTrackingService:
                     .not_.is_("founder_email", "null") \
                     .neq("founder_email", "") \
                     .not_.in_("mail_status", ["email_sent", "reply_received", "followup_10day_sent", "processing"]) \
+                    .order("created_at") \
                     .limit(self.batch_size) \
                     .execute()
             
@@ -121,6 +125,32 @@ class SimplifiedEmailTrackingService:
             logger.error(f"Error getting next batch: {e}")
             return []
     
+    def release_leads(self, leads: list) -> bool:
+        """
+        Undo the 'processing' lock taken by get_next_batch_leads for leads that
+        won't be sent after all, restoring each lead's previous mail_status so
+        the next batch can pick them up again. Leads whose status already moved
+        on from 'processing' (e.g. sent before a shutdown) are left alone.
+        """
+        # One UPDATE per distinct previous status
+        by_status: Dict[Optional[str], list] = {}
+        for lead in leads:
+            by_status.setdefault(lead.get("mail_status"), []).append(lead["id"])
+        
+        try:
+            for status, lead_ids in by_status.items():
+                self.db.table("scraped_data").update({"mail_status": status}) \
+                    .in_("id", lead_ids) \
+                    .eq("mail_status", "processing") \
+                    .execute()
+            
+            logger.info(f"🔓 Released {len(leads)} leads locked for processing")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error releasing leads: {e}")
+            return False
+    
     def mark_leads_processed(self, lead_ids: list) -> bool:
         """Mark leads as processed (won't be selected again)"""
         try:
@@ -5,9 +5,13 @@ import httpx
 import logging
 from typing import Dict, Any, Optional
 from app.core.config import settings
+from app.core.http_client import SharedAsyncClient
 
 logger = logging.getLogger(__name__)
 
+# One pooled client for all webhook calls (keeps the n8n connection alive between sends)
+_webhook_client = SharedAsyncClient("n8n_webhook", timeout=30.0)
+
 class WebhookService:
     """
     Service for sending email data to n8n webhook
@@ -96,99 +100,100 @@ class WebhookService:
             logger.info(f"🚀 WEBHOOK CALL: Sending email data to n8n webhook for {email_to}")
             logger.info(f"📤 WEBHOOK URL: {webhook_url}")
             logger.info(f"📧 Email type: {email_type}")
-            logger.info(f"📦 WEBHOOK PAYLOAD: {payload}")
+            logger.info("📦 WEBHOOK PAYLOAD: %s", payload)
             logger.info(f"📧 Email subject: {subject[:100]}...")
             logger.info(f"📝 Email body length: {len(body)} characters")
             if email_type.startswith("followup_"):
                 logger.info(f"🔗 gmail_thread_id in payload: {payload.get('gmail_thread_id', 'NOT FOUND - THIS IS THE PROBLEM!')}")
             
             # Send to webhook
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    webhook_url,
-                    json=payload,
-                    headers={
-                        "Content-Type": "application/json"
-                    }
-                )
-                
-                # Check response
-                response.raise_for_status()
-                
-                # Try to parse response
-                try:
-                    response_data = response.json()
-                except:
-                    response_data = {"message": response.text}
-                
-                logger.info(f"✅ WEBHOOK HTTP SUCCESS: Response for {email_to}: Status {response.status_code}")
-                logger.info(f"📥 WEBHOOK RESPONSE DATA: {response_data}")
-                
-                # Check if n8n confirms email was sent
-                # REQUIRED: n8n workflow MUST return message_id and gmail_thread_id from Gmail API
-                is_success = False
-                message_id = None
-                gmail_thread_id = None
-                
-                # Check response status code
-                if response.status_code in [200, 201]:
-                    # Check for explicit success flag in response
-                    if response_data.get("success") == True:
-                        message_id = response_data.get("message_id")
-                        gmail_thread_id = response_data.get("gmail_thread_id") or response_data.get("thread_id")  # Support both for backward compatibility
-                        if message_id and gmail_thread_id:
-                            is_success = True
-                        else:
-                            logger.warning(f"⚠️ Webhook returned success=True but missing message_id or gmail_thread_id")
-                    # Check if message_id exists (indicates email was sent)
-                    elif response_data.get("message_id"):
-                        message_id = response_data.get("message_id")
-                        gmail_thread_id = response_data.get("gmail_thread_id") or response_data.get("thread_id")  # Support both for backward compatibility
-                        if message_id:
-                            is_success = True
-                            if not gmail_thread_id:
-                                logger.warning(f"⚠️ Webhook returned message_id but missing gmail_thread_id")
-                    # If we get 200 but no message_id, the workflow needs to be fixed
+            client = _webhook_client.get()
+            response = await client.post(
+                webhook_url,
+                json=payload,
+                headers={
+                    "Content-Type": "application/json"
+                },
+                timeout=self.timeout
+            )
+            
+            # Check response
+            response.raise_for_status()
+            
+            # Try to parse response
+            try:
+                response_data = response.json()
+            except:
+                response_data = {"message": response.text}
+            
+            logger.info(f"✅ WEBHOOK HTTP SUCCESS: Response for {email_to}: Status {response.status_code}")
+            logger.info("📥 WEBHOOK RESPONSE DATA: %s", response_data)
+            
+            # Check if n8n confirms email was sent
+            # REQUIRED: n8n workflow MUST return message_id and gmail_thread_id from Gmail API
+            is_success = False
+            message_id = None
+            gmail_thread_id = None
+            
+            # Check response status code
+            if response.status_code in [200, 201]:
+                # Check for explicit success flag in response
+                if response_data.get("success") == True:
+                    message_id = response_data.get("message_id")
+                    gmail_thread_id = response_data.get("gmail_thread_id") or response_data.get("thread_id")  # Support both for backward compatibility
+                    if message_id and gmail_thread_id:
+                        is_success = True
                     else:
-                        # Check if n8n returned an error
-                        if response_data.get("success") == False:
-                            error_msg = response_data.get("error", "Unknown error")
-                            error_details = response_data.get("error_details") or response_data.get("details") or response_data.get("message", "")
-                            logger.error(f"❌ n8n WORKFLOW ERROR: {error_msg}")
-                            if error_details:
-                                logger.error(f"❌ Error details: {error_details}")
-                            logger.error(f"❌ Full n8n response: {response_data}")
-                            logger.error(f"❌ This indicates the n8n workflow failed to send the email")
-                            logger.error(f"❌ Check n8n workflow logs for Gmail API errors")
-                            logger.error(f"❌ Verify Gmail node configuration uses: $json.gmail_thread_id and $json.message_id")
-                        else:
-                            logger.error(f"❌ Webhook returned 200 but missing required fields. Response: {response_data}")
-                            logger.error(f"❌ n8n workflow MUST return message_id and gmail_thread_id from Gmail API response")
-                            logger.error(f"❌ Expected format: {{'success': true, 'message_id': '...', 'gmail_thread_id': '...'}}")
-                
-                # Build webhook response with Gmail IDs if available
-                webhook_response = {
-                    "success": is_success,
-                    "message": response_data.get("message", "Email sent via webhook" if is_success else "Email sending failed"),
-                    "timestamp": response_data.get("timestamp")
-                }
-                
-                if message_id:
-                    webhook_response["message_id"] = message_id
-                if gmail_thread_id:
-                    webhook_response["gmail_thread_id"] = gmail_thread_id
-                if not is_success:
-                    webhook_response["error"] = response_data.get("error", "Unknown error")
-                
-                logger.info(f"📥 WEBHOOK RESPONSE PARSED: success={is_success}, message_id={message_id}, gmail_thread_id={gmail_thread_id}")
-                
-                return {
-                    "success": is_success,
-                    "webhook_response": webhook_response,
-                    "status_code": response.status_code,
-                    "message": webhook_response.get("message", "Email sent via webhook" if is_success else "Email sending failed")
-                }
-        
+                        logger.warning(f"⚠️ Webhook returned success=True but missing message_id or gmail_thread_id")
+                # Check if message_id exists (indicates email was sent)
+                elif response_data.get("message_id"):
+                    message_id = response_data.get("message_id")
+                    gmail_thread_id = response_data.get("gmail_thread_id") or response_data.get("thread_id")  # Support both for backward compatibility
+                    if message_id:
+                        is_success = True
+                        if not gmail_thread_id:
+                            logger.warning(f"⚠️ Webhook returned message_id but missing gmail_thread_id")
+                # If we get 200 but no message_id, the workflow needs to be fixed
+                else:
+                    # Check if n8n returned an error
+                    if response_data.get("success") == False:
+                        error_msg = response_data.get("error", "Unknown error")
+                        error_details = response_data.get("error_details") or response_data.get("details") or response_data.get("message", "")
+                        logger.error(f"❌ n8n WORKFLOW ERROR: {error_msg}")
+                        if error_details:
+                            logger.error(f"❌ Error details: {error_details}")
+                        logger.error(f"❌ Full n8n response: {response_data}")
+                        logger.error(f"❌ This indicates the n8n workflow failed to send the email")
+                        logger.error(f"❌ Check n8n workflow logs for Gmail API errors")
+                        logger.error(f"❌ Verify Gmail node configuration uses: $json.gmail_thread_id and $json.message_id")
+                    else:
+                        logger.error(f"❌ Webhook returned 200 but missing required fields. Response: {response_data}")
+                        logger.error(f"❌ n8n workflow MUST return message_id and gmail_thread_id from Gmail API response")
+                        logger.error(f"❌ Expected format: {{'success': true, 'message_id': '...', 'gmail_thread_id': '...'}}")
+            
+            # Build webhook response with Gmail IDs if available
+            webhook_response = {
+                "success": is_success,
+                "message": response_data.get("message", "Email sent via webhook" if is_success else "Email sending failed"),
+                "timestamp": response_data.get("timestamp")
+            }
+            
+            if message_id:
+                webhook_response["message_id"] = message_id
+            if gmail_thread_id:
+                webhook_response["gmail_thread_id"] = gmail_thread_id
+            if not is_success:
+                webhook_response["error"] = response_data.get("error", "Unknown error")
+            
+            logger.info(f"📥 WEBHOOK RESPONSE PARSED: success={is_success}, message_id={message_id}, gmail_thread_id={gmail_thread_id}")
+            
+            return {
+                "success": is_success,
+                "webhook_response": webhook_response,
+                "status_code": response.status_code,
+                "message": webhook_response.get("message", "Email sent via webhook" if is_success else "Email sending failed")
+            }
+    
         except httpx.TimeoutException:
             error_msg = f"Webhook timeout after {self.timeout}s"
             logger.error(f"❌ WEBHOOK TIMEOUT: {error_msg} for {email_to}")
@@ -217,7 +222,8 @@ class WebhookService:
                 "success": False,
                 "error": error_msg,
                 "webhook_response": error_response,  # Return error response as dict, not None
-                "status_code": e.response.status_code
+                "status_code": e.response.status_code,
+                "retry_after": e.response.headers.get("Retry-After")
             }
         
         except Exception as e:
@@ -13,9 +13,24 @@ from tenacity import (
 )
 import httpx
 import logging
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+def retry_after_seconds(retry_after: Optional[str], attempt: int, max_wait: float = 60.0) -> float:
+    """
+    Parse a Retry-After header (seconds), falling back to exponential backoff.
+    
+    Args:
+        retry_after: Raw Retry-After header value (may be None)
+        attempt: 1-based attempt number, used for the fallback backoff
+        max_wait: Upper bound on the returned wait in seconds (default: 60)
+    """
+    try:
+        return min(float(retry_after), max_wait)
+    except (TypeError, ValueError):
+        return min(2.0 ** attempt, max_wait)
+
 def api_retry(max_attempts=3, min_wait=2, max_wait=10):
     """
     Retry decorator for API calls with exponential backoff.
@@ -0,0 +1,29 @@
+-- Atomic progress counters for email_batches
+-- Run this in Supabase SQL Editor
+--
+-- BatchTrackingService.increment_progress() calls this via RPC with per-call
+-- deltas instead of writing absolute counts, so concurrent sender workers can
+-- report progress on the same batch without overwriting each other.
+--
+-- NOTE: BatchTrackingService is not used by the live send path (batch tracking
+-- was removed from send_batch). Only run this once it is wired back in.
+
+CREATE OR REPLACE FUNCTION increment_batch_progress(
+    p_batch_id UUID,
+    d_processed INTEGER DEFAULT 0,
+    d_success INTEGER DEFAULT 0,
+    d_failed INTEGER DEFAULT 0,
+    d_skipped INTEGER DEFAULT 0
+)
+RETURNS SETOF email_batches AS $$
+    UPDATE email_batches
+    -- Counters are nullable (INTEGER DEFAULT 0) and NULL + n stays NULL
+    SET processed_count = COALESCE(processed_count, 0) + d_processed,
+        success_count = COALESCE(success_count, 0) + d_success,
+        failed_count = COALESCE(failed_count, 0) + d_failed,
+        skipped_count = COALESCE(skipped_count, 0) + d_skipped
+    WHERE id = p_batch_id
+    RETURNING *;
+$$ LANGUAGE sql;
+
+COMMENT ON FUNCTION increment_batch_progress IS 'Atomically add progress deltas to an email_batches row';
@@ -0,0 +1,39 @@
+-- Atomic claim of the next daily email batch
+-- Run this in Supabase SQL Editor
+--
+-- DailyEmailQuotaService.claim_next_batch_leads() calls this via RPC instead of
+-- get_next_batch_leads() followed by mark_leads_as_processed(). The leads are
+-- selected and flagged for p_today in one statement, and the flagged rows are
+-- returned. FOR UPDATE SKIP LOCKED lets several batch workers claim at the same
+-- time without handing the same lead to two of them.
+--
+-- The WHERE clause must match the filter in get_next_batch_leads.
+--
+-- NOTE: DailyEmailQuotaService is not used by the live send path yet. Only run
+-- this once the service is wired into send_batch.
+
+CREATE OR REPLACE FUNCTION claim_next_email_batch(
+    p_limit INTEGER DEFAULT 400,
+    p_today DATE DEFAULT CURRENT_DATE
+)
+RETURNS SETOF scraped_data AS $$
+    UPDATE scraped_data AS s
+    SET email_batch_processed = TRUE,
+        email_batch_date = p_today
+    WHERE s.id IN (
+        SELECT id
+        FROM scraped_data
+        WHERE (
+            email_batch_processed IS NULL
+            OR email_batch_processed = FALSE
+            OR email_batch_date <> p_today
+        )
+        AND founder_email IS NOT NULL
+        AND founder_email != ''
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING s.*;
+$$ LANGUAGE sql;
+
+COMMENT ON FUNCTION claim_next_email_batch IS 'Mark up to p_limit unbatched leads as processed for p_today and return them';
@@ -0,0 +1,26 @@
+-- Atomic daily quota increment
+-- Run this in Supabase SQL Editor
+--
+-- DailyEmailQuotaService.increment_sent_count() calls this via RPC instead of
+-- reading emails_sent and writing back emails_sent + n. The upsert creates
+-- today's row if needed and adds to the counter in one statement, so
+-- concurrent senders can't both read N and both write N+1.
+--
+-- NOTE: DailyEmailQuotaService is not used by the live send path yet. Only run
+-- this once the service is wired into send_batch.
+
+CREATE OR REPLACE FUNCTION increment_daily_quota(
+    p_date DATE,
+    p_count INTEGER DEFAULT 1,
+    p_limit INTEGER DEFAULT 400
+)
+RETURNS SETOF daily_email_quota AS $$
+    INSERT INTO daily_email_quota AS q (date, emails_sent, quota_limit)
+    VALUES (p_date, p_count, p_limit)
+    ON CONFLICT (date) DO UPDATE
+    -- emails_sent is nullable (INTEGER DEFAULT 0) and NULL + n stays NULL
+    SET emails_sent = COALESCE(q.emails_sent, 0) + EXCLUDED.emails_sent
+    RETURNING q.*;
+$$ LANGUAGE sql;
+
+COMMENT ON FUNCTION increment_daily_quota IS 'Atomically add p_count to the daily_email_quota row for p_date (creating it if missing)';
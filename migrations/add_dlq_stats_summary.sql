@@ -0,0 +1,28 @@
+-- Pre-aggregated DLQ statistics
+-- Run this in Supabase SQL Editor
+--
+-- DeadLetterQueueService.get_dlq_stats() reads this view instead of counting
+-- scraped_data itself. Postgres does the grouping, so the response is one row
+-- per status/error_type pair no matter how large the DLQ grows.
+--
+-- error_type is the identifier prefix of error_message: every DLQ write uses
+-- "<error_type>: <error>" (add_failed_email(s), the retry reschedule/bounce
+-- updates and process_email_queue). Messages without such a prefix (older
+-- rows) are counted as 'unknown'.
+--
+-- CUBE emits subtotal rows where a NULL column means "all":
+--   status = X,    error_type = Y     -> count for that pair
+--   status = X,    error_type IS NULL -> total for status X
+--   status IS NULL, error_type = Y    -> total for error type Y
+--   status IS NULL, error_type IS NULL -> grand total
+
+CREATE OR REPLACE VIEW dlq_stats_summary AS
+SELECT
+    mail_status AS status,
+    COALESCE(substring(error_message FROM '^([A-Za-z_][A-Za-z0-9_]*): '), 'unknown') AS error_type,
+    COUNT(*) AS count
+FROM scraped_data
+WHERE mail_status IN ('failed', 'bounced')
+GROUP BY CUBE (mail_status, COALESCE(substring(error_message FROM '^([A-Za-z_][A-Za-z0-9_]*): '), 'unknown'));
+
+COMMENT ON VIEW dlq_stats_summary IS 'DLQ counts by status and error type, with CUBE subtotals (NULL = all)';
@@ -0,0 +1,12 @@
+-- Partial index for the fallback pass of SimplifiedEmailTrackingService.get_next_batch_leads
+-- Run this in Supabase SQL Editor
+--
+-- Same as idx_scraped_unprocessed (add_unprocessed_leads_index.sql) for leads
+-- with email_processed = false; the same INVARIANT applies.
+--
+-- CONCURRENTLY cannot run inside a transaction block, so this file holds only
+-- this one statement - run it on its own.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_scraped_unprocessed_false
+ON scraped_data(created_at)
+WHERE email_processed = false AND is_verified = true;
@@ -0,0 +1,21 @@
+-- Partial index for SimplifiedEmailTrackingService.get_next_batch_leads
+-- Run this in Supabase SQL Editor
+--
+-- get_next_batch_leads selects verified, unprocessed leads oldest-first:
+--   WHERE is_verified = true AND email_processed IS NULL ... ORDER BY created_at LIMIT n
+-- This index only covers the small unprocessed tail of scraped_data, so the
+-- batch pick is an ordered index scan instead of a full table scan.
+-- The fallback pass (email_processed = false) has its own index in
+-- add_unprocessed_leads_false_index.sql.
+--
+-- INVARIANT: the index predicate must stay in sync with the filters in
+-- get_next_batch_leads. If you add a column to that WHERE clause (or change
+-- is_verified / email_processed semantics), widen or recreate this index.
+--
+-- CONCURRENTLY avoids locking scraped_data for writes while the index builds.
+-- It cannot run inside a transaction block, so this file holds only this one
+-- statement - run it on its own.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_scraped_unprocessed
+ON scraped_data(created_at)
+WHERE email_processed IS NULL AND is_verified = true;